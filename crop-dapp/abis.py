@@ -0,0 +1,24 @@
+import json
+import os
+from functools import lru_cache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Contract ABIs shipped next to the app, by short name
+ABI_FILES = {
+    'crop': 'contract_abi.json',
+    'transporter': 'transporter_abi.json',
+    'quality_inspection': 'quality_inspection_abi.json',
+}
+
+
+# Parsed on first use rather than at import, so workers that never render a dashboard skip it
+@lru_cache(maxsize=None)
+def load_abi(name):
+    with open(os.path.join(BASE_DIR, ABI_FILES[name]), 'r') as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def abi_json(name):
+    return json.dumps(load_abi(name), separators=(',', ':'))
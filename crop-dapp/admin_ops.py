@@ -0,0 +1,105 @@
+from sqlalchemy import delete, or_, select, update
+
+from analytics import apply_inspections, apply_products, apply_sales
+from models import db, User, Product, QualityInspection, RetailSale
+
+# Ids per IN (...) list, well under SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 500
+
+
+class AdminOpError(Exception):
+    pass
+
+
+def _chunks(ids):
+    ids = sorted(set(ids))
+    for i in range(0, len(ids), IN_CHUNK_SIZE):
+        yield ids[i:i + IN_CHUNK_SIZE]
+
+
+def _mark_dirty(key, ids):
+    # Core UPDATE/DELETE statements skip the mapper events the caches listen to,
+    # so the affected ids are queued for the same after-commit invalidation by hand
+    if ids:
+        db.session.info.setdefault(key, set()).update(ids)
+
+
+def assign_transporter(product_ids, transporter_id):
+    """Point products at a transporter (or unassign them with None) in one UPDATE per id chunk.
+
+    Runs in the caller's transaction; returns (updated_ids, missing_ids).
+    """
+    if transporter_id is not None:
+        transporter = db.session.query(User.role, User.active).filter(User.id == transporter_id).first()
+        if transporter is None or transporter.role != 'transporter':
+            raise AdminOpError("unknown transporter")
+        if transporter.active is False:
+            raise AdminOpError("transporter is deactivated")
+    updated = []
+    for chunk in _chunks(product_ids):
+        found = [pid for pid, in db.session.query(Product.id).filter(Product.id.in_(chunk))]
+        if found:
+            db.session.execute(
+                update(Product).where(Product.id.in_(found)).values(assigned_transporter_id=transporter_id),
+                execution_options={'synchronize_session': False}
+            )
+        updated.extend(found)
+    _mark_dirty('trace_dirty', updated)
+    missing = sorted(set(product_ids) - set(updated))
+    return updated, missing
+
+
+def set_users_active(user_ids, active):
+    """Deactivate (or reactivate) users; admins are never touched. Returns the ids changed."""
+    changed = []
+    for chunk in _chunks(user_ids):
+        ids = [uid for uid, in db.session.query(User.id).filter(User.id.in_(chunk), User.role != 'admin')]
+        if ids:
+            db.session.execute(update(User).where(User.id.in_(ids)).values(active=active),
+                               execution_options={'synchronize_session': False})
+        changed.extend(ids)
+    _mark_dirty('identity_dirty', changed)
+    return changed
+
+
+def delete_users(user_ids):
+    """Delete users and everything that cannot exist without them, in the caller's transaction.
+
+    A farmer's products go, with their inspections and sales; inspections and
+    sales recorded by a deleted inspector or retailer go; products assigned to a
+    deleted transporter become unassigned. Admins are never deleted. Returns the
+    ids of the deleted users.
+    """
+    deleted = []
+    for chunk in _chunks(user_ids):
+        ids = [uid for uid, in db.session.query(User.id).filter(User.id.in_(chunk), User.role != 'admin')]
+        if not ids:
+            continue
+        farmed = select(Product.id).where(Product.farmer_id.in_(ids))
+        inspections = or_(QualityInspection.inspector_id.in_(ids), QualityInspection.product_id.in_(farmed))
+        sales = or_(RetailSale.retailer_id.in_(ids), RetailSale.product_id.in_(farmed))
+        transported = Product.assigned_transporter_id.in_(ids)
+        # Every product whose trace changes: deleted ones and those losing a sale, inspection or transporter
+        touched = set(db.session.scalars(farmed))
+        touched.update(db.session.scalars(select(QualityInspection.product_id).where(inspections)))
+        touched.update(db.session.scalars(select(RetailSale.product_id).where(sales)))
+        touched.update(db.session.scalars(select(Product.id).where(transported)))
+
+        # Take the doomed rows out of the analytics rollups while they can still be aggregated
+        conn = db.session.connection()
+        apply_inspections(conn, inspections, -1)
+        apply_sales(conn, sales, -1)
+        apply_products(conn, Product.farmer_id.in_(ids), -1)
+
+        opts = {'synchronize_session': False}
+        db.session.execute(delete(QualityInspection).where(inspections), execution_options=opts)
+        db.session.execute(delete(RetailSale).where(sales), execution_options=opts)
+        db.session.execute(update(Product).where(transported).values(assigned_transporter_id=None), execution_options=opts)
+        db.session.execute(delete(Product).where(Product.farmer_id.in_(ids)), execution_options=opts)
+        db.session.execute(delete(User).where(User.id.in_(ids)), execution_options=opts)
+        _mark_dirty('trace_dirty', touched)
+        deleted.extend(ids)
+    _mark_dirty('identity_dirty', deleted)
+    # Objects already loaded in this session may now point at deleted rows
+    db.session.expire_all()
+    return deleted
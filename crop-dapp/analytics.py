@@ -0,0 +1,174 @@
+from sqlalchemy import and_, event, func, inspect, or_, select
+
+from listing import _page
+from models import db, Product, QualityInspection, RetailSale, FarmerRollup, RetailerDailySales, GradeRollup
+from sql_utils import increment
+
+# Columns whose changes move a row between rollup buckets or change its sums
+PRODUCT_COLUMNS = ('farmer_id', 'quantity', 'soil', 'irrigation')
+INSPECTION_COLUMNS = ('product_id', 'grade', 'ml_score')
+SALE_COLUMNS = ('retailer_id', 'sale_price', 'timestamp')
+ROLLUPS = (FarmerRollup, RetailerDailySales, GradeRollup)
+
+
+# ---------- set-based deltas ----------
+# Each apply_* aggregates the rows matching `where` with GROUP BY and adds (sign=1)
+# or removes (sign=-1) them from the rollups. The ORM events, the Core bulk paths
+# and the rebuild all go through these, so they cannot drift apart.
+def apply_products(conn, where, sign=1):
+    rows = conn.execute(
+        select(Product.farmer_id, func.count(Product.id), func.coalesce(func.sum(Product.quantity), 0))
+        .where(where).group_by(Product.farmer_id)
+    ).all()
+    increment(conn, FarmerRollup.__table__, [
+        {'farmer_id': farmer_id, 'products': sign * n, 'quantity': sign * quantity, 'inspections': 0, 'scored': 0, 'score_sum': 0.0}
+        for farmer_id, n, quantity in rows
+    ], ['farmer_id'])
+
+
+def apply_inspections(conn, where, sign=1):
+    scored = func.count(QualityInspection.ml_score)
+    score_sum = func.coalesce(func.sum(QualityInspection.ml_score), 0.0)
+    base = select().select_from(QualityInspection).join(Product, Product.id == QualityInspection.product_id).where(where)
+    by_farmer = conn.execute(
+        base.add_columns(Product.farmer_id, func.count(QualityInspection.id), scored, score_sum).group_by(Product.farmer_id)
+    ).all()
+    increment(conn, FarmerRollup.__table__, [
+        {'farmer_id': farmer_id, 'products': 0, 'quantity': 0, 'inspections': sign * n, 'scored': sign * s, 'score_sum': sign * total}
+        for farmer_id, n, s, total in by_farmer
+    ], ['farmer_id'])
+    bucket = (func.coalesce(Product.soil, ''), func.coalesce(Product.irrigation, ''), func.coalesce(QualityInspection.grade, ''))
+    by_bucket = conn.execute(
+        base.add_columns(*bucket, func.count(QualityInspection.id), scored, score_sum).group_by(*bucket)
+    ).all()
+    increment(conn, GradeRollup.__table__, [
+        {'soil': soil, 'irrigation': irrigation, 'grade': grade, 'inspections': sign * n, 'scored': sign * s, 'score_sum': sign * total}
+        for soil, irrigation, grade, n, s, total in by_bucket
+    ], ['soil', 'irrigation', 'grade'])
+
+
+def apply_sales(conn, where, sign=1):
+    day = func.coalesce(func.date(RetailSale.timestamp), '')
+    rows = conn.execute(
+        select(RetailSale.retailer_id, day, func.count(RetailSale.id), func.coalesce(func.sum(RetailSale.sale_price), 0.0))
+        .where(where).group_by(RetailSale.retailer_id, day)
+    ).all()
+    increment(conn, RetailerDailySales.__table__, [
+        {'retailer_id': retailer_id, 'day': str(d), 'sales': sign * n, 'revenue': sign * revenue}
+        for retailer_id, d, n, revenue in rows
+    ], ['retailer_id', 'day'])
+
+
+def rebuild(chunk_size=5000, progress=None):
+    """Recompute every rollup from the base tables in id-ranged, committed chunks.
+
+    Meant for first deploy or after a manual data fix; writes made while it runs
+    can be counted twice or not at all, so run it when the app is quiet.
+    """
+    for model in ROLLUPS:
+        db.session.execute(model.__table__.delete())
+    db.session.commit()
+    for model, apply in ((Product, apply_products), (QualityInspection, apply_inspections), (RetailSale, apply_sales)):
+        max_id = db.session.scalar(select(func.max(model.id))) or 0
+        last_id = 0
+        while last_id < max_id:
+            hi = min(last_id + chunk_size, max_id)
+            apply(db.session.connection(), and_(model.id > last_id, model.id <= hi))
+            db.session.commit()
+            last_id = hi
+            if progress:
+                progress(model.__tablename__, last_id, max_id)
+
+
+# ---------- ORM events: every row written through the session ----------
+def _changed(target, columns):
+    state = inspect(target)
+    return any(state.attrs[c].history.has_changes() for c in columns)
+
+
+def _track(model, columns, apply_own, apply_children=None):
+    # Updates are applied as "remove the old row" before the UPDATE and "add the new row" after it
+    def own(target):
+        return model.id == target.id
+
+    def on_insert(mapper, connection, target):
+        apply_own(connection, own(target), 1)
+
+    def before_update(mapper, connection, target):
+        if _changed(target, columns):
+            apply_own(connection, own(target), -1)
+            if apply_children:
+                apply_children(connection, target, -1)
+
+    def after_update(mapper, connection, target):
+        if _changed(target, columns):
+            apply_own(connection, own(target), 1)
+            if apply_children:
+                apply_children(connection, target, 1)
+
+    def before_delete(mapper, connection, target):
+        apply_own(connection, own(target), -1)
+        if apply_children:
+            apply_children(connection, target, -1)
+
+    event.listen(model, 'after_insert', on_insert)
+    event.listen(model, 'before_update', before_update)
+    event.listen(model, 'after_update', after_update)
+    event.listen(model, 'before_delete', before_delete)
+
+
+def _product_inspections(connection, target, sign):
+    # A product's farmer, soil or irrigation decides where its inspections are counted
+    apply_inspections(connection, QualityInspection.product_id == target.id, sign)
+
+
+_track(Product, PRODUCT_COLUMNS, apply_products, _product_inspections)
+_track(QualityInspection, INSPECTION_COLUMNS, apply_inspections)
+_track(RetailSale, SALE_COLUMNS, apply_sales)
+
+
+# ---------- reads: primary-key lookups on the rollups ----------
+def _average(total, n):
+    return round(total / n, 4) if n else None
+
+
+def farmer_stats(farmer_id=None, after_id=0, limit=50):
+    """Per-farmer product count, quantity, inspections and average ML score, keyed on farmer id."""
+    query = db.session.query(FarmerRollup).filter(
+        FarmerRollup.farmer_id > after_id, or_(FarmerRollup.products != 0, FarmerRollup.inspections != 0)
+    )
+    if farmer_id is not None:
+        query = query.filter(FarmerRollup.farmer_id == farmer_id)
+    rows = query.order_by(FarmerRollup.farmer_id).limit(limit + 1).all()
+    items, next_after = _page(rows, limit, lambda r: r.farmer_id)
+    return [{
+        'farmer_id': r.farmer_id, 'products': r.products, 'quantity': r.quantity,
+        'inspections': r.inspections, 'avg_score': _average(r.score_sum, r.scored),
+    } for r in items], next_after
+
+
+def retailer_sales(retailer_id=None, since=None, until=None, limit=366):
+    """Daily sales rows, newest first; since/until are YYYY-MM-DD (until exclusive)."""
+    query = db.session.query(RetailerDailySales).filter(RetailerDailySales.sales != 0)
+    if retailer_id is not None:
+        query = query.filter(RetailerDailySales.retailer_id == retailer_id)
+    if since:
+        query = query.filter(RetailerDailySales.day >= since)
+    if until:
+        query = query.filter(RetailerDailySales.day < until)
+    rows = query.order_by(RetailerDailySales.day.desc(), RetailerDailySales.retailer_id).limit(limit).all()
+    return [{'retailer_id': r.retailer_id, 'day': r.day, 'sales': r.sales, 'revenue': r.revenue} for r in rows]
+
+
+def grade_distribution(soil=None, irrigation=None):
+    """Inspection counts and average ML score per (soil, irrigation, grade)."""
+    query = db.session.query(GradeRollup).filter(GradeRollup.inspections != 0)
+    if soil is not None:
+        query = query.filter(GradeRollup.soil == soil)
+    if irrigation is not None:
+        query = query.filter(GradeRollup.irrigation == irrigation)
+    rows = query.order_by(GradeRollup.soil, GradeRollup.irrigation, GradeRollup.grade).all()
+    return [{
+        'soil': r.soil or None, 'irrigation': r.irrigation or None, 'grade': r.grade or None,
+        'inspections': r.inspections, 'avg_score': _average(r.score_sum, r.scored),
+    } for r in rows]
@@ -1,109 +1,175 @@
-
-import os
 from dotenv import load_dotenv
-import json
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-import qrcode
-import io
-import base64
-from ml_quality_model import grade_crop
-from models import db, User, Product, QualityInspection, RetailSale
-from eth_account.messages import encode_defunct
-from eth_account import Account  # for signature recovery
+import click
+from flask import Blueprint, Flask, Response, current_app, render_template, request, redirect, url_for, session, flash, jsonify, send_file, abort, stream_with_context
+from admin_ops import assign_transporter as assign_transporter_bulk, set_users_active, delete_users, AdminOpError
+from analytics import farmer_stats, retailer_sales, grade_distribution, rebuild as rebuild_analytics
+from assets import assets
+from backfill import BACKFILLS, BackfillRunner
+from catalogue import consumer_catalogue, retailer_catalogue
+from chain_submitter import chain_submitter
+from config import load_config
+import db_profiles
+from export import export_stream, parse_date, filename as export_filename, ExportError, ENTITIES as EXPORT_ENTITIES, FORMATS as EXPORT_FORMATS
+from grade_cache import grade_cache
+from identity import identity_cache
+from instrumentation import instrumentation
+from ingest import ingest_products, iter_records, IngestError
+from jobs import job_queue, job_status, JobQueueFull
+from listing import list_users, list_products, list_transporters, suggest_transporters
+from passwords import password_hasher
+from migrations import upgrade_schema, seed_default_users, migrate_qr_images
+from provenance import build_trace, trace_cache
+from qr_store import qr_store, qr_hash as compute_qr_hash, HASH_RE
+from search import search_products
+from wallets import signature_cache
+from worker_pool import PoolSaturated
+from models import db, User, Product, QualityInspection, RetailSale, Job, ChainCrop, ChainTransport, ChainInspection
 from sqlalchemy.orm import joinedload
 
 load_dotenv()
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///crop_app.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.secret_key = os.environ.get('FLASK_SECRET', 'supersecretkey')
-
-db.init_app(app)
-
-# Use absolute paths for ABI files
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-with open(os.path.join(BASE_DIR, 'contract_abi.json'), 'r') as f:
-    CONTRACT_ABI = json.load(f)
-
-CONTRACT_ADDRESS = os.environ.get('CONTRACT_ADDRESS', '0x61eedc5753741826a3f29236f9675460c9a9342e')
-
-with open(os.path.join(BASE_DIR, 'transporter_abi.json'), 'r') as f:
-    TRANSPORTER_ABI = json.load(f)
-TRANSPORTER_CONTRACT_ADDRESS = os.environ.get('TRANSPORTER_CONTRACT_ADDRESS', '0x913c828e417c1fa7d2cd33f1ef9240011bafef1c')
-
-# Load QualityInspectionRegistry ABI and address
-with open(os.path.join(BASE_DIR, 'quality_inspection_abi.json'), 'r') as f:
-    QUALITY_INSPECTION_ABI = json.load(f)
-QUALITY_INSPECTION_CONTRACT_ADDRESS = os.environ.get('QUALITY_INSPECTION_CONTRACT_ADDRESS', '0x39e4b7d3729642c3289007dfbdc5adb8bd73c817')
 
+bp = Blueprint('web', __name__)
+
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    Creating an app touches neither the database nor the ABI files; schema
+    upgrades and default users are applied once per deploy with
+    `flask --app app init-db`.
+    """
+    app = Flask(__name__)
+    app.config.update(load_config())
+    if config:
+        app.config.update(config)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', db_profiles.engine_options(app.config))
+
+    db.init_app(app)
+    db_profiles.init_app(app)
+    assets.init_app(app)
+    instrumentation.init_app(app)
+    grade_cache.init_app(app)
+    identity_cache.init_app(app)
+    password_hasher.init_app(app)
+    signature_cache.init_app(app)
+    qr_store.init_app(app)
+    job_queue.init_app(app)
+    chain_submitter.init_app(app)
+    trace_cache.init_app(app)
+
+    app.register_blueprint(bp)
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(migrate_qr_command)
+    app.cli.add_command(export_command)
+    app.cli.add_command(backfill_command)
+    app.cli.add_command(rebuild_analytics_command)
+    return app
+
+
+# ---------- CLI ----------
+@click.command('init-db')
+def init_db_command():
+    """Create/upgrade the schema and seed the default users."""
+    upgrade_schema()
+    seed_default_users()
+    click.echo("Database ready.")
+
+
+@click.command('migrate-qr')
+def migrate_qr_command():
+    """Move inline base64 QR images into the QR store."""
+    click.echo(f"Moved {migrate_qr_images()} QR images into {qr_store.root}")
+
+
+@click.command('export')
+@click.argument('entity', type=click.Choice(list(EXPORT_ENTITIES)))
+@click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv')
+@click.option('--gzip/--no-gzip', default=False)
+@click.option('--owner', type=int, help="Farmer, inspector or retailer id, depending on the entity.")
+@click.option('--since', help="ISO date or datetime, inclusive.")
+@click.option('--until', help="ISO date or datetime, exclusive.")
+@click.option('-o', '--output', type=click.File('wb'), default='-')
+def export_command(entity, fmt, gzip, owner, since, until, output):
+    """Stream products, inspections or sales as CSV/NDJSON."""
+    try:
+        chunks = export_stream(entity, fmt, gzip, owner, parse_date(since, 'since'), parse_date(until, 'until'),
+                               current_app.config['EXPORT_CHUNK_SIZE'])
+    except ExportError as e:
+        raise click.UsageError(str(e))
+    for chunk in chunks:
+        output.write(chunk)
+
+
+@click.command('backfill')
+@click.argument('name', type=click.Choice(list(BACKFILLS)))
+@click.option('--chunk-size', type=int, help="Rows per committed chunk (default BACKFILL_CHUNK_SIZE).")
+@click.option('--dry-run', is_flag=True, help="Count the rows that would change; write nothing.")
+@click.option('--restart', is_flag=True, help="Forget an interrupted run's checkpoint and start from the first id.")
+@click.option('--pause-ms', type=float, default=0, help="Sleep between chunks to leave room for live traffic.")
+def backfill_command(name, chunk_size, dry_run, restart, pause_ms):
+    """Run a resumable, chunked data repair (product-defaults, regrade-inspections)."""
+    def progress(last_id, max_id, changed, elapsed):
+        click.echo(f"{name}: {last_id}/{max_id} ids, {changed} {'to change' if dry_run else 'changed'}, {elapsed:.1f}s")
+
+    runner = BackfillRunner(BACKFILLS[name](), chunk_size or current_app.config['BACKFILL_CHUNK_SIZE'],
+                            dry_run=dry_run, pause=pause_ms / 1000, progress=progress)
+    if restart and not dry_run:
+        runner.reset()
+    changed = runner.run()
+    click.echo(f"{name}: done, {changed} rows {'would change' if dry_run else 'changed'}.")
+
+
+@click.command('rebuild-analytics')
+@click.option('--chunk-size', type=int, default=5000, help="Base-table rows aggregated per committed chunk.")
+def rebuild_analytics_command(chunk_size):
+    """Recompute the analytics rollups from products, inspections and sales."""
+    rebuild_analytics(chunk_size, progress=lambda table, last_id, max_id: click.echo(f"{table}: {last_id}/{max_id}"))
+    click.echo("Analytics rebuilt.")
 
-# Create DB + default admin workaround for broken before_first_request
-@app.before_request
-def create_tables():
-    if not hasattr(app, '_tables_created'):
-        db.create_all()
-        if not User.query.filter_by(username='admin').first():
-            admin = User(username="admin", role="admin")
-            admin.set_password("admin123")
-            db.session.add(admin)
-            db.session.commit()
-        # Create default inspector
-        if not User.query.filter_by(username='inspector').first():
-            inspector = User(username="inspector", role="inspector")
-            inspector.set_password("inspector123")
-            db.session.add(inspector)
-            db.session.commit()
-        # Remove all retailers except 'retailer', and reset password
-        retailers = User.query.filter_by(role='retailer').all()
-        for r in retailers:
-            if r.username != 'retailer':
-                db.session.delete(r)
-        db.session.commit()
-        retailer = User.query.filter_by(username='retailer').first()
-        if not retailer:
-            retailer = User(username="retailer", role="retailer")
-            retailer.set_password("retailer123")
-            db.session.add(retailer)
-        else:
-            retailer.set_password("retailer123")
-        db.session.commit()
-        app._tables_created = True
 
 def current_user():
-    if 'user_id' in session:
-        return User.query.get(session['user_id'])
-    return None
+    # Cached identity snapshot (id, username, role, wallet_address), not a User row
+    return identity_cache.current()
+
+@bp.before_app_request
+def drop_stale_session():
+    # Sessions of deleted or deactivated users end on their next request
+    if 'user_id' in session and current_user() is None:
+        session.clear()
 
 # ---------- Routes ----------
-@app.route('/')
+@bp.route('/')
 def home():
     user = current_user()
     return render_template('login.html', user=user)
 
 # Retailer dashboard route
-@app.route('/retailer_dashboard')
+@bp.route('/retailer_dashboard')
 def retailer_dashboard():
     user = current_user()
-    products = Product.query.all()
-    return render_template('retailer.html', user=user, products=products)
-
-# Log sale and generate QR code
-@app.route('/log_sale', methods=['POST'])
+    # One page of product cards; the sale form's product picker searches /api/products
+    after = request.args.get('after', 0, type=int)
+    entries, next_after = retailer_catalogue(after_id=after, limit=current_app.config['CATALOGUE_PAGE_SIZE'])
+    return render_template('retailer.html', user=user, entries=entries, next_after=next_after)
+
+# Render a sale's QR PNG into the content-addressed store
+@job_queue.handler('render_qr')
+def render_qr_job(payload):
+    return {'qr_hash': qr_store.put(payload['qr_data'])}
+
+# Log sale; the QR image is rendered by a background job
+@bp.route('/log_sale', methods=['POST'])
 def log_sale():
+    if job_queue.full():
+        return jsonify({"error": "busy, retry shortly"}), 503, {'Retry-After': '5'}
     data = request.get_json()
     product_id = data.get('product_id')
     sale_price = data.get('sale_price')
     retail_details = data.get('retail_details')
-    # Store sale details on blockchain (placeholder, implement actual contract call)
-    tx_hash = None  # TODO: integrate blockchain transaction
-    # Generate QR code with product info
     qr_data = f"ProductID:{product_id}|SalePrice:{sale_price}|Details:{retail_details}"
-    img = qrcode.make(qr_data)
-    buf = io.BytesIO()
-    img.save(buf, format='PNG')
-    qr_b64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-    # Store in DB
+    qr_hash = compute_qr_hash(qr_data)
+    # Store in DB; the render job is dispatched once this commits, and chain_submitter.py
+    # anchors the sale in its next batch and fills in tx_hash
     retailer_id = session.get('user_id')
     sale = RetailSale(
         product_id=product_id,
@@ -111,14 +177,54 @@ def log_sale():
         sale_price=sale_price,
         retail_details=retail_details,
         qr_data=qr_data,
-        qr_img=qr_b64,
-        tx_hash=tx_hash
+        qr_hash=qr_hash
     )
     db.session.add(sale)
+    try:
+        job = job_queue.enqueue('render_qr', {'qr_data': qr_data})
+    except JobQueueFull:
+        db.session.rollback()
+        return jsonify({"error": "busy, retry shortly"}), 503, {'Retry-After': '5'}
     db.session.commit()
-    return jsonify({'qr_data': qr_data, 'qr_img': qr_b64})
-
-@app.route('/register', methods=['GET','POST'])
+    return jsonify({
+        'qr_data': qr_data,
+        'qr_hash': qr_hash,
+        'qr_url': url_for('web.qr_image', qr_hash=qr_hash),
+        'job_id': job.id,
+        'job_url': url_for('web.job_detail', job_id=job.id)
+    }), 202
+
+# Poll a background job
+@bp.route('/jobs/<int:job_id>')
+def job_detail(job_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "login required"}), 401
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(job_status(job))
+
+# Serve stored QR PNGs; the hash names the content, so responses are immutable
+@bp.route('/qr/<qr_hash>.png')
+def qr_image(qr_hash):
+    if not HASH_RE.match(qr_hash):
+        abort(404)
+    if not qr_store.exists(qr_hash):
+        # Re-render from the sale record if the file was lost (e.g. a fresh disk)
+        sale = RetailSale.query.filter_by(qr_hash=qr_hash).first()
+        if not sale or not sale.qr_data:
+            abort(404)
+        qr_store.put(sale.qr_data)
+    response = send_file(qr_store.path(qr_hash), mimetype='image/png', etag=qr_hash, max_age=current_app.config['QR_CACHE_MAX_AGE'], conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def too_busy():
+    # Password hashing backlog is full; shed the request rather than queue it
+    return "Too many sign-ins in progress, please retry in a moment.", 429, {'Retry-After': '2'}
+
+@bp.route('/register', methods=['GET','POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username'].strip()
@@ -126,45 +232,59 @@ def register():
         role = request.form['role'].lower()
         if User.query.filter_by(username=username).first():
             flash("Username already exists")
-            return redirect(url_for('register'))
-        user = User(username=username, role=role)
-        user.set_password(password)
+            return redirect(url_for('web.register'))
+        try:
+            password_hash = password_hasher.hash(password)
+        except PoolSaturated:
+            return too_busy()
+        user = User(username=username, role=role, password_hash=password_hash)
         db.session.add(user)
         db.session.commit()
         flash("Registration successful! Please login.")
-        return redirect(url_for('home'))
+        return redirect(url_for('web.home'))
     return render_template('register.html', user=current_user())
 
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
     username = request.form['username']
     password = request.form['password']
     user = User.query.filter_by(username=username).first()
-    if user and user.check_password(password):
+    if not user or user.active is False:
+        flash("Invalid credentials")
+        return redirect(url_for('web.home'))
+    try:
+        ok, new_hash = password_hasher.verify(user.password_hash, password)
+    except PoolSaturated:
+        return too_busy()
+    if ok:
+        if new_hash:
+            # Stored hash predates the configured method or cost; upgrade it now that we have the password
+            user.password_hash = new_hash
+            db.session.commit()
         session['user_id'] = user.id
         session['role'] = user.role
         flash("Logged in")
         if user.role == 'farmer':
-            return redirect(url_for('farmer_dashboard'))
+            return redirect(url_for('web.farmer_dashboard'))
         if user.role == 'consumer':
-            return redirect(url_for('consumer_dashboard'))
+            return redirect(url_for('web.consumer_dashboard'))
         if user.role == 'retailer':
-            return redirect(url_for('retailer_dashboard'))
+            return redirect(url_for('web.retailer_dashboard'))
         if user.role == 'transporter':
-            return redirect(url_for('transporter_dashboard'))
+            return redirect(url_for('web.transporter_dashboard'))
         if user.role == 'inspector':
-            return redirect(url_for('inspector_dashboard'))
-        return redirect(url_for('admin_dashboard'))
+            return redirect(url_for('web.inspector_dashboard'))
+        return redirect(url_for('web.admin_dashboard'))
     flash("Invalid credentials")
-    return redirect(url_for('home'))
+    return redirect(url_for('web.home'))
 
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     session.clear()
-    return redirect(url_for('home'))
+    return redirect(url_for('web.home'))
 
 # Link Wallet endpoint (verifies signature)
-@app.route('/link_wallet', methods=['POST'])
+@bp.route('/link_wallet', methods=['POST'])
 def link_wallet():
     if 'user_id' not in session:
         return jsonify({"error": "login required"}), 401
@@ -175,12 +295,10 @@ def link_wallet():
     if not message or not signature or not address:
         return jsonify({"error": "missing fields"}), 400
 
-    try:
-        # recover the address from the signature
-        encoded = encode_defunct(text=message)
-        recovered = Account.recover_message(encoded, signature=signature)
-    except Exception as e:
-        return jsonify({"error": "invalid signature", "detail": str(e)}), 400
+    # Recoveries are cached, so a retried (message, signature) pair skips the EC math
+    recovered, error = signature_cache.recover(message, signature)
+    if error:
+        return jsonify({"error": "invalid signature", "detail": error}), 400
 
     if recovered.lower() != address.lower():
         return jsonify({"error": "signature does not match address"}), 400
@@ -191,8 +309,51 @@ def link_wallet():
     db.session.commit()
     return jsonify({"ok": True, "wallet_address": address})
 
+# Link many wallets at once (e.g. a cooperative's members); admin only
+@bp.route('/link_wallets', methods=['POST'])
+def link_wallets():
+    user = current_user()
+    if not user or user.role != 'admin':
+        return jsonify({"error": "admin only"}), 403
+    data = request.get_json(silent=True) or {}
+    items = data.get('wallets')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "wallets must be a non-empty list"}), 400
+    limit = current_app.config['WALLET_BATCH_LIMIT']
+    if len(items) > limit:
+        return jsonify({"error": f"at most {limit} wallets per batch"}), 400
+    for item in items:
+        if not isinstance(item, dict) or not all(isinstance(item.get(k), str) and item.get(k) for k in ('username', 'message', 'signature', 'address')):
+            return jsonify({"error": "each wallet needs username, message, signature and address"}), 400
+
+    try:
+        recovered = signature_cache.recover_many([(item['message'], item['signature']) for item in items])
+    except PoolSaturated:
+        return jsonify({"error": "busy, retry shortly"}), 429, {'Retry-After': '5'}
+    user_ids = dict(db.session.query(User.username, User.id).filter(User.username.in_({item['username'] for item in items})).all())
+
+    results, updates = [], {}
+    for item, (signer, error) in zip(items, recovered):
+        result = {'username': item['username'], 'address': item['address'], 'ok': False}
+        if error:
+            result['error'] = "invalid signature"
+        elif signer.lower() != item['address'].lower():
+            result['error'] = "signature does not match address"
+        elif item['username'] not in user_ids:
+            result['error'] = "unknown user"
+        else:
+            result['ok'] = True
+            updates[user_ids[item['username']]] = item['address']
+        results.append(result)
+    if updates:
+        db.session.execute(db.update(User), [{'id': uid, 'wallet_address': addr} for uid, addr in updates.items()])
+        # Bulk updates skip the mapper events the identity cache listens to
+        db.session.info.setdefault('identity_dirty', set()).update(updates)
+        db.session.commit()
+    return jsonify({'linked': len(updates), 'results': results})
+
 # Called by frontend after successful on-chain tx to record product locally
-@app.route('/record_product', methods=['POST'])
+@bp.route('/record_product', methods=['POST'])
 def record_product():
     if 'user_id' not in session:
         return jsonify({"error": "login required"}), 401
@@ -226,142 +387,412 @@ def record_product():
     db.session.commit()
     return jsonify({"ok": True, "product_id": p.id})
 
+# Bulk variant of /record_product: JSON array or NDJSON stream, one transaction for the whole upload
+@bp.route('/record_products', methods=['POST'])
+def record_products():
+    if 'user_id' not in session:
+        return jsonify({"error": "login required"}), 401
+    try:
+        results = ingest_products(
+            iter_records(request),
+            farmer_id=session['user_id'],
+            chunk_size=current_app.config['BULK_INSERT_CHUNK_SIZE'],
+            max_rows=current_app.config['BULK_PRODUCT_LIMIT']
+        )
+    except IngestError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    db.session.commit()
+    inserted = sum(1 for r in results if 'product_id' in r)
+    return jsonify({
+        "ok": True,
+        "inserted": inserted,
+        "failed": len(results) - inserted,
+        "results": results
+    })
+
 # Farmer dashboard
-@app.route('/farmer', methods=['GET'])
+@bp.route('/farmer', methods=['GET'])
 def farmer_dashboard():
     if session.get('role') != 'farmer':
-        return redirect(url_for('home'))
+        return redirect(url_for('web.home'))
     user = current_user()
-    # send ABI & contract address to template for frontend to use
-    return render_template('farmer.html', user=user, abi=json.dumps(CONTRACT_ABI), contract_address=CONTRACT_ADDRESS)
+    products = Product.query.filter_by(farmer_id=user.id).all()
+    # contract address for the frontend; the ABI is fetched from its cached /abi/ URL
+    return render_template('farmer.html', user=user, products=products, contract_address=current_app.config['CONTRACT_ADDRESS'])
 
 # Consumer dashboard
-@app.route('/consumer', methods=['GET'])
+@bp.route('/consumer', methods=['GET'])
 def consumer_dashboard():
     if session.get('role') != 'consumer':
-        return redirect(url_for('home'))
+        return redirect(url_for('web.home'))
     user = current_user()
-    # Eager load all relationships for product catalogue
-    all_products = Product.query.options(
-        joinedload(Product.farmer),
-        joinedload(Product.inspections),
-        joinedload(Product.retail_sales).joinedload(RetailSale.retailer)
-    ).all()
-    # Only show products with at least one retailer sale (QR generated)
-    products = [p for p in all_products if p.retail_sales and len(p.retail_sales) > 0]
-    return render_template('consumer.html', user=user, products=products, abi=json.dumps(CONTRACT_ABI), contract_address=CONTRACT_ADDRESS)
+    # One page of sold products with only their latest sale and inspection
+    after = request.args.get('after', 0, type=int)
+    entries, next_after = consumer_catalogue(after_id=after, limit=current_app.config['CATALOGUE_PAGE_SIZE'])
+    return render_template('consumer.html', user=user, entries=entries, next_after=next_after)
 
 # Admin dashboard
-@app.route('/admin', methods=['GET', 'POST'])
+@bp.route('/admin', methods=['GET', 'POST'])
 def admin_dashboard():
     if session.get('role') != 'admin':
-        return redirect(url_for('home'))
-    users = User.query.filter(User.role != 'admin').all()
-    products = Product.query.all()
-    transporters = User.query.filter_by(role='transporter').all()
-    return render_template('admin.html', users=users, products=products, transporters=transporters, user=current_user())
+        return redirect(url_for('web.home'))
+    # Users and products are paged in by the page itself from the /api/* lists
+    return render_template('admin.html', user=current_user())
 
-@app.route('/admin/delete/<int:user_id>', methods=['GET'])
+@bp.route('/admin/delete/<int:user_id>', methods=['POST'])
 def delete_user(user_id):
     if session.get('role') != 'admin':
-        return redirect(url_for('home'))
-    user = User.query.get(user_id)
-    if user:
-        db.session.delete(user)
-        db.session.commit()
-    return redirect(url_for('admin_dashboard'))
+        return redirect(url_for('web.home'))
+    delete_users([user_id])
+    db.session.commit()
+    return redirect(url_for('web.admin_dashboard'))
 
-@app.route('/assign_transporter', methods=['POST'])
+@bp.route('/assign_transporter', methods=['POST'])
 def assign_transporter():
     if session.get('role') != 'admin':
-        return redirect(url_for('admin_dashboard'))
-    product_id = request.form.get('product_id')
-    transporter_id = request.form.get('transporter_id')
-    product = Product.query.get(product_id)
-    transporter = User.query.get(transporter_id)
-    if not product or not transporter or transporter.role != 'transporter':
+        return redirect(url_for('web.admin_dashboard'))
+    product_id = request.form.get('product_id', type=int)
+    transporter_id = request.form.get('transporter_id', type=int)
+    try:
+        updated, _ = assign_transporter_bulk([product_id] if product_id else [], transporter_id)
+    except AdminOpError:
+        updated = []
+    if not updated or transporter_id is None:
+        db.session.rollback()
         flash('Invalid product or transporter')
-        return redirect(url_for('admin_dashboard'))
-    product.assigned_transporter_id = transporter_id
+        return redirect(url_for('web.admin_dashboard'))
     db.session.commit()
     flash('Transporter assigned successfully')
-    return redirect(url_for('admin_dashboard'))
+    return redirect(url_for('web.admin_dashboard'))
+
+# ---------- Bulk admin mutations: JSON in, JSON out, one transaction each ----------
+def bulk_ids(field):
+    """Validated id list from the JSON body, or an error response."""
+    data = request.get_json(silent=True) or {}
+    ids = data.get(field)
+    if not isinstance(ids, list) or not ids:
+        return data, None, (jsonify({"error": f"{field} must be a non-empty list"}), 400)
+    limit = current_app.config['ADMIN_BULK_LIMIT']
+    if len(ids) > limit:
+        return data, None, (jsonify({"error": f"at most {limit} ids per request"}), 400)
+    if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return data, None, (jsonify({"error": f"{field} must be integers"}), 400)
+    return data, ids, None
+
+@bp.route('/api/products/assign', methods=['POST'])
+def api_assign_transporter():
+    if session.get('role') != 'admin':
+        return jsonify({"error": "forbidden"}), 403
+    data, product_ids, error = bulk_ids('product_ids')
+    if error:
+        return error
+    transporter_id = data.get('transporter_id')
+    if transporter_id is not None and not isinstance(transporter_id, int):
+        return jsonify({"error": "transporter_id must be an integer or null"}), 400
+    try:
+        updated, missing = assign_transporter_bulk(product_ids, transporter_id)
+    except AdminOpError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
+    db.session.commit()
+    return jsonify({'updated': len(updated), 'product_ids': updated, 'missing': missing, 'transporter_id': transporter_id})
+
+@bp.route('/api/users/deactivate', methods=['POST'])
+def api_deactivate_users():
+    if session.get('role') != 'admin':
+        return jsonify({"error": "forbidden"}), 403
+    data, user_ids, error = bulk_ids('user_ids')
+    if error:
+        return error
+    active = data.get('active', False) is True
+    changed = set_users_active(user_ids, active)
+    db.session.commit()
+    return jsonify({'updated': len(changed), 'user_ids': changed, 'active': active})
+
+@bp.route('/api/users/delete', methods=['POST'])
+def api_delete_users():
+    if session.get('role') != 'admin':
+        return jsonify({"error": "forbidden"}), 403
+    _, user_ids, error = bulk_ids('user_ids')
+    if error:
+        return error
+    deleted = delete_users(user_ids)
+    db.session.commit()
+    return jsonify({'deleted': len(deleted), 'user_ids': deleted})
+
+# ---------- Search: BM25-ranked full text with facet counts ----------
+@bp.route('/search')
+def search():
+    if current_user() is None:
+        return jsonify({"error": "login required"}), 403
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = max(1, min(request.args.get('limit', current_app.config['CATALOGUE_PAGE_SIZE'], type=int), current_app.config['API_PAGE_MAX']))
+    result = search_products(
+        q=request.args.get('q'),
+        organic={'1': True, '0': False}.get(request.args.get('organic')),
+        soil=request.args.get('soil') or None,
+        grade=request.args.get('grade') or None,
+        offset=offset,
+        limit=limit,
+        facets=request.args.get('facets') != '0'
+    )
+    result['next_offset'] = offset + limit if offset + limit < result['total'] else None
+    return jsonify(result)
+
+# ---------- Exports: streamed straight from the cursor, gzip by default ----------
+@bp.route('/export/<entity>')
+def export_data(entity):
+    if session.get('role') not in ('admin', 'inspector'):
+        return jsonify({"error": "forbidden"}), 403
+    fmt = request.args.get('format', 'csv')
+    gzip = request.args.get('gzip', '1') != '0'
+    try:
+        chunks = export_stream(
+            entity, fmt, gzip,
+            owner_id=request.args.get('owner', type=int),
+            since=parse_date(request.args.get('since'), 'since'),
+            until=parse_date(request.args.get('until'), 'until'),
+            chunk_size=current_app.config['EXPORT_CHUNK_SIZE']
+        )
+    except ExportError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(
+        stream_with_context(chunks),
+        mimetype='application/gzip' if gzip else EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{export_filename(entity, fmt, gzip)}"'}
+    )
+
+# ---------- Analytics: read straight from the rollup tables ----------
+def analytics_allowed():
+    return session.get('role') in ('admin', 'inspector', 'retailer')
+
+@bp.route('/analytics/farmers')
+def analytics_farmers():
+    if not analytics_allowed():
+        return jsonify({"error": "forbidden"}), 403
+    after, limit = page_args()
+    items, next_after = farmer_stats(farmer_id=request.args.get('farmer_id', type=int), after_id=after, limit=limit)
+    return jsonify({'items': items, 'next_after': next_after})
+
+@bp.route('/analytics/sales')
+def analytics_sales():
+    if not analytics_allowed():
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify({'items': retailer_sales(
+        retailer_id=request.args.get('retailer_id', type=int),
+        since=request.args.get('since'),
+        until=request.args.get('until')
+    )})
+
+@bp.route('/analytics/grades')
+def analytics_grades():
+    if not analytics_allowed():
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify({'items': grade_distribution(soil=request.args.get('soil'), irrigation=request.args.get('irrigation'))})
+
+# ---------- List APIs: pages keyed on id, pass next_after back as ?after= ----------
+def page_args():
+    limit = request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int)
+    return request.args.get('after', 0, type=int), max(1, min(limit, current_app.config['API_PAGE_MAX']))
+
+@bp.route('/api/users')
+def api_users():
+    if session.get('role') != 'admin':
+        return jsonify({"error": "forbidden"}), 403
+    after, limit = page_args()
+    items, next_after = list_users(q=request.args.get('q'), role=request.args.get('role'), after_id=after, limit=limit)
+    return jsonify({'items': items, 'next_after': next_after})
+
+@bp.route('/api/products')
+def api_products():
+    if session.get('role') not in ('admin', 'inspector', 'retailer'):
+        return jsonify({"error": "forbidden"}), 403
+    after, limit = page_args()
+    assigned = request.args.get('assigned')
+    items, next_after = list_products(
+        q=(request.args.get('q') or '').strip(),
+        farmer_id=request.args.get('farmer_id', type=int),
+        transporter_id=request.args.get('transporter_id', type=int),
+        assigned={'1': True, '0': False}.get(assigned),
+        after_id=after,
+        limit=limit
+    )
+    return jsonify({'items': items, 'next_after': next_after})
+
+@bp.route('/api/transporters')
+def api_transporters():
+    if session.get('role') != 'admin':
+        return jsonify({"error": "forbidden"}), 403
+    after, limit = page_args()
+    items, next_after = list_transporters(q=request.args.get('q'), after_id=after, limit=limit)
+    return jsonify({'items': items, 'next_after': next_after})
+
+# Typeahead for the admin's transporter assignment box
+@bp.route('/api/transporters/suggest')
+def api_transporter_suggest():
+    if session.get('role') != 'admin':
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(suggest_transporters((request.args.get('q') or '').strip()))
 
 # Transporter dashboard
-@app.route('/transporter', methods=['GET'])
+@bp.route('/transporter', methods=['GET'])
 def transporter_dashboard():
     if session.get('role') != 'transporter':
-        return redirect(url_for('home'))
+        return redirect(url_for('web.home'))
     user = current_user()
     # Only show products assigned to this transporter
     products = Product.query.options(joinedload(Product.assigned_transporter)).filter_by(assigned_transporter_id=user.id).all()
-    return render_template('transporter.html', user=user, products=products, transporter_abi=json.dumps(TRANSPORTER_ABI), transporter_contract_address=TRANSPORTER_CONTRACT_ADDRESS)
+    return render_template('transporter.html', user=user, products=products, transporter_contract_address=current_app.config['TRANSPORTER_CONTRACT_ADDRESS'])
 
 # Inspector dashboard
-@app.route('/inspector', methods=['GET'])
+@bp.route('/inspector', methods=['GET'])
 def inspector_dashboard():
     if session.get('role') != 'inspector':
-        return redirect(url_for('home'))
+        return redirect(url_for('web.home'))
     user = current_user()
-    products = Product.query.all()
     return render_template(
         'inspector.html',
         user=user,
-        products=products,
-        quality_inspection_abi=json.dumps(QUALITY_INSPECTION_ABI),
-        quality_inspection_contract_address=QUALITY_INSPECTION_CONTRACT_ADDRESS
+        quality_inspection_contract_address=current_app.config['QUALITY_INSPECTION_CONTRACT_ADDRESS']
     )
 
-@app.route('/record_inspection', methods=['POST'])
+@bp.route('/record_inspection', methods=['POST'])
 def record_inspection():
     product_id = request.form['product_id']
     inspector_id = session.get('user_id')
     remarks = request.form['remarks']
-    # Fetch product details for ML grading
-    product = Product.query.get(product_id)
-    if product:
-        score, grade, certification = grade_crop(
-            product.fertilizer,
-            product.organic,
-            product.soil,
-            product.irrigation,
-            product.quantity,
-            product.quality
-        )
-    else:
-        score, grade, certification = 0, 'N/A', 'N/A'
+    # ML grading goes through the cache; the preview for this product has usually warmed it
+    score, grade, certification = grade_cache.grade_product(int(product_id))
     inspection = QualityInspection(
         product_id=product_id,
         inspector_id=inspector_id,
-        remarks=remarks,
-        score=score,
+        comments=remarks,
+        ml_score=score,
         grade=grade,
-        certification=certification
+        certificate=certification
     )
     db.session.add(inspection)
     db.session.commit()
-    return redirect(url_for('inspector_dashboard'))
+    return redirect(url_for('web.inspector_dashboard'))
 
-@app.route('/ml_grade_preview')
+@bp.route('/ml_grade_preview')
 def ml_grade_preview():
-    product_id = request.args.get('product_id')
-    product = Product.query.get(product_id)
-    if product:
-        score, grade, certification = grade_crop(
-            product.fertilizer,
-            product.organic,
-            product.soil,
-            product.irrigation,
-            product.quantity,
-            product.quality
-        )
-        return jsonify({
+    product_id = request.args.get('product_id', type=int)
+    if product_id is None:
+        return jsonify({'score': 0, 'grade': 'N/A', 'certification': 'N/A'})
+    score, grade, certification = grade_cache.grade_product(product_id)
+    return jsonify({
+        'score': score,
+        'grade': grade,
+        'certification': certification
+    })
+
+@bp.route('/ml_grade_cache/stats')
+def ml_grade_cache_stats():
+    if session.get('role') not in ('admin', 'inspector'):
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(grade_cache.stats())
+
+# Grade many products at once: one query for the features, one vectorized grading pass
+@bp.route('/ml_grade_batch', methods=['POST'])
+def ml_grade_batch():
+    if 'user_id' not in session:
+        return jsonify({"error": "login required"}), 401
+    data = request.get_json(silent=True) or {}
+    product_ids = data.get('product_ids')
+    if not isinstance(product_ids, list) or not product_ids:
+        return jsonify({"error": "product_ids must be a non-empty list"}), 400
+    try:
+        product_ids = [int(pid) for pid in product_ids]
+    except (TypeError, ValueError):
+        return jsonify({"error": "product_ids must be integers"}), 400
+    limit = current_app.config['ML_GRADE_BATCH_LIMIT']
+    if len(product_ids) > limit:
+        return jsonify({"error": f"at most {limit} products per batch"}), 400
+
+    rows = db.session.query(
+        Product.id,
+        Product.fertilizer,
+        Product.organic,
+        Product.soil,
+        Product.irrigation,
+        Product.quantity,
+        Product.quality
+    ).filter(Product.id.in_(set(product_ids))).all()
+    graded = dict(zip((r[0] for r in rows), grade_cache.grade_many([tuple(r[1:]) for r in rows])))
+    results = []
+    for pid in product_ids:
+        score, grade, certification = graded.get(pid, (0, 'N/A', 'N/A'))
+        results.append({
+            'product_id': pid,
             'score': score,
             'grade': grade,
             'certification': certification
         })
-    else:
-        return jsonify({'score': 0, 'grade': 'N/A', 'certification': 'N/A'})
+    return jsonify({'results': results})
+
+# Full farm -> transport -> inspection -> retail story for a product (what a QR scan shows)
+@bp.route('/trace/<int:product_id>')
+def trace(product_id):
+    cached = trace_cache.get(product_id)
+    if cached is None:
+        payload = build_trace(product_id)
+        if payload is None:
+            return jsonify({"error": "not found"}), 404
+        cached = trace_cache.put(product_id, payload)
+    etag, body = cached
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients and proxies may store it but must revalidate; unchanged traces cost a 304
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# Batches sent by chain_submitter.py and records still waiting for one
+@bp.route('/chain/submissions')
+def chain_submissions():
+    if session.get('role') != 'admin':
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(chain_submitter.stats())
+
+# ---------- Provenance mirrored from chain by chain_indexer.py ----------
+@bp.route('/chain/crops')
+def chain_crops():
+    after = request.args.get('after', 0, type=int)
+    limit = min(request.args.get('limit', 100, type=int), 500)
+    q = ChainCrop.query.filter(ChainCrop.id > after)
+    if request.args.get('farmer'):
+        q = q.filter(ChainCrop.farmer_address == request.args['farmer'])
+    crops = q.order_by(ChainCrop.id).limit(limit).all()
+    return jsonify({
+        'crops': [{
+            'id': c.id, 'farmer': c.farmer_address, 'name': c.name, 'details': c.details,
+            'price': c.price, 'quantity': c.quantity, 'quality': c.quality, 'fertilizer': c.fertilizer,
+            'organic': c.organic, 'soil': c.soil, 'irrigation': c.irrigation, 'tx_hash': c.tx_hash
+        } for c in crops],
+        'next_after': crops[-1].id if len(crops) == limit else None
+    })
+
+@bp.route('/chain/transports/<int:crop_id>')
+def chain_transports(crop_id):
+    records = ChainTransport.query.filter_by(crop_id=crop_id).order_by(ChainTransport.id).all()
+    return jsonify([{
+        'recordId': r.id, 'cropId': r.crop_id, 'transporter': r.transporter_address, 'location': r.location,
+        'custody': r.custody, 'timestamp': r.timestamp, 'txHash': r.tx_hash
+    } for r in records])
+
+@bp.route('/chain/inspections/<int:product_id>')
+def chain_inspections(product_id):
+    records = ChainInspection.query.filter_by(product_id=product_id).order_by(ChainInspection.id).all()
+    return jsonify([{
+        'inspectionId': r.id, 'productId': r.product_id, 'inspector': r.inspector_address, 'score': r.score,
+        'grade': r.grade, 'certificate': r.certificate, 'comments': r.comments, 'timestamp': r.timestamp,
+        'txHash': r.tx_hash
+    } for r in records])
 
 if __name__ == "__main__":
+    app = create_app()
+    with app.app_context():
+        job_queue.resume()
     app.run(debug=True)
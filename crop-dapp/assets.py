@@ -0,0 +1,146 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import namedtuple
+
+from flask import Response, abort, request, send_file, url_for
+
+from abis import ABI_FILES, abi_json
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt; without it only gzip variants are built
+    brotli = None
+
+# Types worth compressing; images and fonts are already compressed
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+# Files larger than this are served as-is rather than compressed into memory
+MAX_PRECOMPRESS_BYTES = 1024 * 1024
+
+Asset = namedtuple('Asset', 'digest mimetype path body variants')
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _variants(data, mimetype):
+    """Precompressed bodies by Content-Encoding, keeping only those that are smaller."""
+    if not mimetype.startswith(COMPRESSIBLE) or len(data) > MAX_PRECOMPRESS_BYTES:
+        return {}
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data, quality=11)
+    return {enc: body for enc, body in variants.items() if len(body) < len(data)}
+
+
+class AssetStore:
+    """Content-hashed URLs for contract ABIs and static files.
+
+    Each ABI is serialized once per process and served from
+    /abi/<name>.<hash>.json; static files are linked as /static/<file>?v=<hash>.
+    A URL carrying the current hash never changes meaning, so it is sent with an
+    immutable year-long Cache-Control; anything else is sent with no-cache and an
+    ETag, so browsers revalidate with a cheap 304. Text assets get gzip and
+    brotli variants (br needs the brotli package from requirements.txt and is
+    skipped without it), built once and picked by Accept-Encoding. Like
+    load_abi, everything is built on first use rather than at app creation.
+    """
+
+    def __init__(self):
+        self.max_age = 31536000
+        self.static_folder = None
+        self._abis = {}
+        self._static = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_age = app.config.get('ASSET_CACHE_MAX_AGE', self.max_age)
+        self.static_folder = app.static_folder
+        app.add_url_rule('/abi/<name>.<digest>.json', 'abi', self.abi_view)
+        # Flask's own static route, now with versioned caching and compressed variants
+        app.view_functions['static'] = self.static_view
+        app.add_template_global(self.abi_url)
+        app.add_template_global(self.asset_url)
+
+    # ---------- ABIs ----------
+    def abi(self, name):
+        asset = self._abis.get(name)
+        if asset is None:
+            data = abi_json(name).encode('utf-8')
+            asset = Asset(_digest(data), 'application/json', None, data, _variants(data, 'application/json'))
+            with self._lock:
+                self._abis[name] = asset
+        return asset
+
+    def abi_url(self, name):
+        return url_for('abi', name=name, digest=self.abi(name).digest)
+
+    def abi_view(self, name, digest):
+        if name not in ABI_FILES:
+            abort(404)
+        asset = self.abi(name)
+        if digest != asset.digest:
+            # A page rendered before a deploy asking for the previous ABI
+            abort(404)
+        return self._respond(asset, versioned=True)
+
+    # ---------- static files ----------
+    def static_asset(self, filename):
+        path = os.path.realpath(os.path.join(self.static_folder, filename))
+        if not path.startswith(os.path.realpath(self.static_folder) + os.sep) or not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        key = (filename, stat.st_mtime_ns, stat.st_size)
+        asset = self._static.get(key)
+        if asset is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+            mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            # Only compressed variants stay in memory; the plain body is streamed from disk
+            asset = Asset(_digest(data), mimetype, path, None, _variants(data, mimetype))
+            with self._lock:
+                self._static = {k: v for k, v in self._static.items() if k[0] != filename}
+                self._static[key] = asset
+        return asset
+
+    def asset_url(self, filename):
+        asset = self.static_asset(filename)
+        if asset is None:
+            return url_for('static', filename=filename)
+        return url_for('static', filename=filename, v=asset.digest)
+
+    def static_view(self, filename):
+        asset = self.static_asset(filename)
+        if asset is None:
+            abort(404)
+        return self._respond(asset, versioned=request.args.get('v') == asset.digest)
+
+    # ---------- responses ----------
+    def _respond(self, asset, versioned):
+        encoding = next((enc for enc in ('br', 'gzip') if enc in asset.variants and enc in request.accept_encodings), None)
+        if encoding:
+            response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+            response.headers['Content-Encoding'] = encoding
+            # Each encoding is a different byte sequence, so it gets its own strong ETag
+            response.set_etag(f'{asset.digest}-{encoding}')
+        elif asset.body is not None:
+            response = Response(asset.body, mimetype=asset.mimetype)
+            response.set_etag(asset.digest)
+        else:
+            response = send_file(asset.path, mimetype=asset.mimetype, etag=asset.digest, conditional=False)
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        if versioned:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+
+assets = AssetStore()
@@ -0,0 +1,173 @@
+import logging
+import time
+from abc import ABC, abstractmethod
+
+from sqlalchemy import case, func, or_, select, update
+
+from analytics import apply_inspections, apply_products
+from grade_cache import FEATURE_COLUMNS, grade_cache
+from models import db, Product, QualityInspection, BackfillCheckpoint
+from sql_utils import upsert
+
+log = logging.getLogger(__name__)
+
+
+def _mark_dirty(product_ids):
+    # Set-based UPDATEs skip the mapper events provenance listens to
+    if product_ids:
+        db.session.info.setdefault('trace_dirty', set()).update(product_ids)
+
+
+class Backfill(ABC):
+    """One data repair, applied to the rows of `model` with lo < id <= hi.
+
+    run_chunk returns the number of rows it changed (or would change when
+    dry_run is set, in which case it must not write).
+    """
+
+    name = None
+    model = None
+
+    @abstractmethod
+    def run_chunk(self, lo, hi, dry_run):
+        pass
+
+
+class ProductDefaults(Backfill):
+    """Fill blank product features with defaults, as fix_products.py used to."""
+
+    name = 'product-defaults'
+    model = Product
+    DEFAULTS = {
+        'fertilizer': 'urea',
+        'organic': 'organic',
+        'soil': 'loamy',
+        'irrigation': 'drip',
+        'quantity': 1,
+        'quality': 'medium',
+    }
+
+    def _blank(self, column):
+        col = getattr(Product, column)
+        if column == 'quantity':
+            return col.is_(None)
+        return or_(col.is_(None), func.trim(col) == '')
+
+    def run_chunk(self, lo, hi, dry_run):
+        in_range = (Product.id > lo, Product.id <= hi)
+        needs_fix = or_(*(self._blank(c) for c in self.DEFAULTS))
+        ids = list(db.session.scalars(select(Product.id).where(*in_range, needs_fix)))
+        if ids and not dry_run:
+            conn = db.session.connection()
+            # Quantity, soil and irrigation feed the rollups: remove the old values, add the new ones
+            apply_products(conn, Product.id.in_(ids), -1)
+            apply_inspections(conn, QualityInspection.product_id.in_(ids), -1)
+            db.session.execute(
+                update(Product).where(*in_range, needs_fix).values({
+                    c: case((self._blank(c), default), else_=getattr(Product, c)) for c, default in self.DEFAULTS.items()
+                }),
+                execution_options={'synchronize_session': False}
+            )
+            apply_products(conn, Product.id.in_(ids))
+            apply_inspections(conn, QualityInspection.product_id.in_(ids))
+            _mark_dirty(ids)
+        return len(ids)
+
+
+class RegradeInspections(Backfill):
+    """Recompute stored ML score, grade and certificate with the current model."""
+
+    name = 'regrade-inspections'
+    model = QualityInspection
+
+    def run_chunk(self, lo, hi, dry_run):
+        rows = db.session.query(
+            QualityInspection.id, QualityInspection.product_id, QualityInspection.ml_score,
+            QualityInspection.grade, QualityInspection.certificate, *(getattr(Product, c) for c in FEATURE_COLUMNS)
+        ).join(Product, Product.id == QualityInspection.product_id).filter(
+            QualityInspection.id > lo, QualityInspection.id <= hi
+        ).all()
+        graded = grade_cache.grade_many([r[5:] for r in rows])
+        updates = [
+            {'id': r.id, 'ml_score': score, 'grade': grade, 'certificate': certificate}
+            for r, (score, grade, certificate) in zip(rows, graded)
+            if (r.ml_score, r.grade, r.certificate) != (score, grade, certificate)
+        ]
+        if updates and not dry_run:
+            changed = {u['id'] for u in updates}
+            conn = db.session.connection()
+            apply_inspections(conn, QualityInspection.id.in_(changed), -1)
+            db.session.execute(update(QualityInspection), updates)
+            apply_inspections(conn, QualityInspection.id.in_(changed))
+            _mark_dirty({r.product_id for r in rows if r.id in changed})
+        return len(updates)
+
+
+BACKFILLS = {b.name: b for b in (ProductDefaults, RegradeInspections)}
+
+
+class BackfillRunner:
+    """Apply a Backfill over id-ranged chunks, committing each chunk with its checkpoint.
+
+    Each chunk is one short transaction (the repair plus the advanced
+    BackfillCheckpoint row), so a live database never sees a long-held write
+    lock, and a crashed or interrupted run resumes after the last committed
+    chunk. The chunk that reaches the end deletes the checkpoint instead, so
+    the next invocation (after a model change, or once new rows need the
+    repair) scans the whole table again. Ids are walked up to the max id seen
+    at start; rows inserted later are already written by current code. dry_run
+    counts what would change and writes nothing, checkpoint included. pause
+    sleeps between chunks to leave room for request traffic.
+    """
+
+    def __init__(self, backfill, chunk_size=1000, dry_run=False, pause=0.0, progress=None):
+        self.backfill = backfill
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.pause = pause
+        # progress(last_id, max_id, changed, elapsed) after every chunk
+        self.progress = progress
+
+    def checkpoint(self):
+        cp = db.session.get(BackfillCheckpoint, self.backfill.name)
+        return (cp.last_id, cp.changed) if cp else (0, 0)
+
+    def reset(self):
+        db.session.query(BackfillCheckpoint).filter_by(name=self.backfill.name).delete()
+        db.session.commit()
+
+    def run(self):
+        """Process every chunk after the checkpoint. Returns the rows changed (or that would change) in this run."""
+        model = self.backfill.model
+        max_id = db.session.scalar(select(func.max(model.id))) or 0
+        last_id, total = (0, 0) if self.dry_run else self.checkpoint()
+        if last_id >= max_id:
+            # Nothing left to resume (an older completed run, or the tail rows were deleted): start over
+            last_id, total = 0, 0
+        changed = 0
+        started = time.monotonic()
+        while last_id < max_id:
+            hi = min(last_id + self.chunk_size, max_id)
+            try:
+                n = self.backfill.run_chunk(last_id, hi, self.dry_run)
+                if self.dry_run:
+                    db.session.rollback()
+                else:
+                    if hi == max_id:
+                        # Finished: forget the checkpoint in the same transaction as the last chunk
+                        db.session.query(BackfillCheckpoint).filter_by(name=self.backfill.name).delete()
+                    else:
+                        upsert(db.session.connection(), BackfillCheckpoint.__table__,
+                               [{'name': self.backfill.name, 'last_id': hi, 'changed': total + changed + n}], ['name'])
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            changed += n
+            last_id = hi
+            log.info("%s: ids up to %d of %d, %d changed", self.backfill.name, last_id, max_id, changed)
+            if self.progress:
+                self.progress(last_id, max_id, changed, time.monotonic() - started)
+            if self.pause:
+                time.sleep(self.pause)
+        return changed
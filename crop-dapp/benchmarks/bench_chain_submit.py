@@ -0,0 +1,118 @@
+"""Chain submission throughput: one transaction per record vs. batched anchoring.
+
+Seeds a database with benchmarks/seed.py (every product, inspection and sale
+starts unanchored), then for each batch size runs ChainSubmitter on a fresh copy
+against an in-process EVM (eth-tester on py-evm, auto-mining every transaction):
+records are signed, sent, their receipts awaited by the chain_receipt job and
+the tx hashes written back. Batch size 1 is the per-item baseline. Reports
+records/s end to end, transactions and gas per record, and checks that every
+submitted record got its tx hash.
+
+    python benchmarks/bench_chain_submit.py [--products 1000] [--records 600] [--batch-sizes 1,50,200]
+
+Needs eth-tester with the py-evm backend (pip install "eth-tester[py-evm]").
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from eth_account import Account  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+from web3 import Web3, EthereumTesterProvider  # noqa: E402
+
+from seed import bench_app, close_database, seed  # noqa: E402
+
+
+class LockedTesterProvider(EthereumTesterProvider):
+    # py-evm is not thread-safe; the receipt jobs and the submitter share one chain
+    _lock = threading.Lock()
+
+    def make_request(self, method, params):
+        with self._lock:
+            return super().make_request(method, params)
+
+
+def funded_chain():
+    w3 = Web3(LockedTesterProvider())
+    account = Account.create()
+    w3.eth.wait_for_transaction_receipt(w3.eth.send_transaction({
+        'from': w3.eth.accounts[0], 'to': account.address, 'value': Web3.to_wei(1000, 'ether'),
+    }))
+    return w3, account.key
+
+
+def run(db_path, batch_size, records):
+    from chain_submitter import chain_submitter, ENTITIES
+    from jobs import job_queue
+    from models import db, ChainBatch
+
+    app = bench_app(db_path, CHAIN_BATCH_SIZE=batch_size, JOB_WORKERS=2, CHAIN_RECEIPT_TIMEOUT=10)
+    with app.app_context():
+        w3, key = funded_chain()
+        chain_submitter.connect(w3, key)
+        sent = 0
+        started = time.perf_counter()
+        while sent < records:
+            items = chain_submitter.pending(min(batch_size, records - sent))
+            if not items:
+                break
+            chain_submitter.submit(items)
+            sent += len(items)
+        while job_queue.stats()['in_flight']:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - started
+        db.session.close()
+        anchored = sum(db.session.scalar(select(func.count(model.id)).where(model.tx_hash.isnot(None)))
+                       for model, _, _ in ENTITIES.values())
+        txs, gas = db.session.query(func.count(ChainBatch.id), func.sum(ChainBatch.gas_used)).filter(
+            ChainBatch.status == 'confirmed').one()
+        close_database()
+    assert anchored == sent, f"{anchored} of {sent} records got a tx hash"
+    return {'records': sent, 'seconds': round(elapsed, 3), 'records_per_s': round(sent / elapsed, 1),
+            'transactions': txs, 'gas_per_record': round((gas or 0) / sent)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--records', type=int, default=600, help="records submitted per batch size")
+    parser.add_argument('--batch-sizes', default='1,50,200')
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-chain-')
+    seeded = os.path.join(workdir, 'seed.db')
+    app = bench_app(seeded)
+    with app.app_context():
+        seed(args.products, progress=None)
+        close_database()
+
+    results = {}
+    for batch_size in (int(b) for b in args.batch_sizes.split(',')):
+        db_path = os.path.join(workdir, f'batch-{batch_size}.db')
+        shutil.copy(seeded, db_path)
+        results[batch_size] = run(db_path, batch_size, args.records)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    baseline = results.get(1)
+    print(f"{'batch size':>10} {'records':>8} {'seconds':>8} {'records/s':>10} {'txs':>6} {'gas/record':>11} {'speedup':>8}")
+    for batch_size, r in results.items():
+        speedup = f"{r['records_per_s'] / baseline['records_per_s']:.1f}x" if baseline else '-'
+        print(f"{batch_size:>10} {r['records']:>8} {r['seconds']:>8} {r['records_per_s']:>10} "
+              f"{r['transactions']:>6} {r['gas_per_record']:>11} {speedup:>8}")
+
+
+if __name__ == '__main__':
+    main()
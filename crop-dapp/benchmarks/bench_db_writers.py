@@ -0,0 +1,141 @@
+"""Concurrent writer load test for the database engine profiles.
+
+Writer threads each insert a product and commit in a loop while reader threads
+query the farmer dashboard's product list, the way waitress threads and the job
+workers share the database in production. Every profile gets a fresh database
+file; commits/s, write latency percentiles and lock errors are reported.
+
+    python benchmarks/bench_db_writers.py [--writers 8] [--readers 4] [--seconds 10] [--profiles default,sqlite]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import create_app  # noqa: E402
+from config import load_config  # noqa: E402
+from migrations import upgrade_schema  # noqa: E402
+from models import db, User, Product  # noqa: E402
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_profile(profile, writers, readers, seconds):
+    workdir = tempfile.mkdtemp(prefix=f'bench-db-{profile}-')
+    config = load_config()
+    config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    config['QR_STORE_DIR'] = os.path.join(workdir, 'qr')
+    config['DB_PROFILE'] = profile
+    config['DB_POOL_SIZE'] = max(config['DB_POOL_SIZE'], writers + readers)
+    config['GRADE_CACHE_PERSIST'] = False
+    app = create_app(config)
+    with app.app_context():
+        upgrade_schema()
+        farmer = User(username='bench-farmer', role='farmer')
+        farmer.set_password('bench')
+        db.session.add(farmer)
+        db.session.commit()
+        farmer_id = farmer.id
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies, errors, reads = [], [], [0]
+
+    def writer(n):
+        local = []
+        with app.app_context():
+            i = 0
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    db.session.add(Product(name=f'w{n}-{i}', farmer_id=farmer_id, quantity=1,
+                                           quality='Good', fertilizer='Organic', organic='Yes',
+                                           soil='Loamy', irrigation='Drip'))
+                    db.session.commit()
+                    local.append(time.perf_counter() - started)
+                except OperationalError as exc:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(str(exc.orig))
+                i += 1
+            db.session.remove()
+        with lock:
+            latencies.extend(local)
+
+    def reader():
+        count = 0
+        with app.app_context():
+            while not stop.is_set():
+                try:
+                    db.session.query(Product.id, Product.name).filter_by(farmer_id=farmer_id) \
+                        .order_by(Product.id.desc()).limit(50).all()
+                    db.session.rollback()
+                    count += 1
+                except OperationalError as exc:
+                    db.session.rollback()
+                    with lock:
+                        errors.append(str(exc.orig))
+            db.session.remove()
+        with lock:
+            reads[0] += count
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    with app.app_context():
+        db.engine.dispose()
+    return {
+        'profile': profile,
+        'commits': len(latencies),
+        'commits_per_s': len(latencies) / elapsed,
+        'reads_per_s': reads[0] / elapsed,
+        'write_p50_ms': percentile(latencies, 50) * 1000,
+        'write_p95_ms': percentile(latencies, 95) * 1000,
+        'write_p99_ms': percentile(latencies, 99) * 1000,
+        'write_mean_ms': (statistics.fmean(latencies) * 1000) if latencies else 0.0,
+        'lock_errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--profiles', default='default,sqlite')
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+    results = [run_profile(p, args.writers, args.readers, args.seconds) for p in args.profiles.split(',')]
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:g}s per profile")
+    print(f"  {'profile':<10}{'commits/s':>11}{'reads/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'locked':>8}")
+    for r in results:
+        print(f"  {r['profile']:<10}{r['commits_per_s']:>11.0f}{r['reads_per_s']:>10.0f}{r['write_p50_ms']:>9.1f}"
+              f"{r['write_p95_ms']:>9.1f}{r['write_p99_ms']:>9.1f}{r['lock_errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
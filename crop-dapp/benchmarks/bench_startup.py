@@ -0,0 +1,80 @@
+"""Worker cold-start benchmark.
+
+Each run is a fresh interpreter that imports the app, builds it, and serves its
+first request, so module import cost, app construction and first-request work
+are all measured the way an autoscaled worker would pay them.
+
+    python benchmarks/bench_startup.py [--runs 10] [--app-dir PATH]
+
+--app-dir points at another checkout of crop-dapp to compare against it (trees
+from before the app factory expose a module-level `app` instead of create_app).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_APP_DIR = os.path.dirname(HERE)
+
+CHILD = r'''
+import sys, time, json
+t0 = time.perf_counter()
+import app as app_module
+t1 = time.perf_counter()
+app = app_module.create_app() if hasattr(app_module, 'create_app') else app_module.app
+t2 = time.perf_counter()
+client = app.test_client()
+client.get('/')
+t3 = time.perf_counter()
+client.get('/')
+t4 = time.perf_counter()
+print(json.dumps({'import': t1 - t0, 'create_app': t2 - t1, 'first_request': t3 - t2, 'second_request': t4 - t3}))
+'''
+
+SETUP = r'''
+import app as app_module
+if hasattr(app_module, 'create_app'):
+    from migrations import upgrade_schema, seed_default_users
+    app = app_module.create_app()
+    with app.app_context():
+        upgrade_schema()
+        seed_default_users()
+'''
+
+
+def run(app_dir, runs):
+    env = dict(os.environ)
+    db_path = os.path.join(tempfile.mkdtemp(prefix='bench-startup-'), 'bench.db')
+    env['DATABASE_URL'] = f'sqlite:///{db_path}'
+    env['QR_STORE_DIR'] = os.path.join(os.path.dirname(db_path), 'qr')
+    subprocess.run([sys.executable, '-c', SETUP], cwd=app_dir, env=env, check=True)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', CHILD], cwd=app_dir, env=env, check=True,
+                             capture_output=True, text=True).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return {key: statistics.median(s[key] for s in samples) for key in samples[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--app-dir', default=DEFAULT_APP_DIR)
+    parser.add_argument('--json', action='store_true', help="print the medians as JSON")
+    args = parser.parse_args()
+    result = run(os.path.abspath(args.app_dir), args.runs)
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"median of {args.runs} cold starts ({args.app_dir})")
+    for key, value in result.items():
+        print(f"  {key:<15} {value * 1000:8.1f} ms")
+    print(f"  {'total':<15} {(result['import'] + result['create_app'] + result['first_request']) * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
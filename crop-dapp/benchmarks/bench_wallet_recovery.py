@@ -0,0 +1,83 @@
+"""Wallet signature recovery throughput: one at a time vs. batched on the process pool.
+
+Signs --pairs distinct messages with fresh keys, then recovers them
+  - inline, one call per pair (what /link_wallet does on a cache miss),
+  - again through the signature cache (every pair a hit, i.e. client retries),
+  - through SignatureCache.recover_many on a pool of 1..--max-workers processes
+    (what /link_wallets does), starting from a cold cache each time.
+
+    python benchmarks/bench_wallet_recovery.py [--pairs 2000] [--max-workers 4] [--chunk 64]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from wallets import SignatureCache, recover_chunk, recover_signer  # noqa: E402
+
+
+def make_pairs(n):
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+    pairs, addresses = [], []
+    for i in range(n):
+        acct = Account.create()
+        message = f"Link wallet {acct.address} to crop-dapp user {i}"
+        signed = Account.sign_message(encode_defunct(text=message), private_key=acct.key)
+        pairs.append((message, '0x' + signed.signature.hex().removeprefix('0x')))
+        addresses.append(acct.address)
+    return pairs, addresses
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pairs', type=int, default=2000)
+    parser.add_argument('--max-workers', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--chunk', type=int, default=64)
+    parser.add_argument('--json', action='store_true', help="print the results as JSON")
+    args = parser.parse_args()
+
+    pairs, addresses = make_pairs(args.pairs)
+    recover_signer(*pairs[0])  # import eth_account outside the timings
+    results = {}
+
+    recovered, elapsed = timed(lambda: [recover_signer(m, s) for m, s in pairs])
+    assert recovered == addresses
+    results['inline'] = args.pairs / elapsed
+
+    cache = SignatureCache(maxsize=args.pairs, chunk_size=args.chunk)
+    for m, s in pairs:
+        cache.recover(m, s)
+    recovered, elapsed = timed(lambda: [cache.recover(m, s)[0] for m, s in pairs])
+    assert recovered == addresses
+    results['cached'] = args.pairs / elapsed
+
+    for workers in range(1, args.max_workers + 1):
+        cache = SignatureCache(maxsize=args.pairs, chunk_size=args.chunk)
+        cache.pool.configure(workers, max_pending=args.pairs, timeout=600)
+        cache.pool.map(recover_chunk, [pairs[:1]] * workers)  # start the workers and import eth_account there
+        recovered, elapsed = timed(lambda: [a for a, _ in cache.recover_many(pairs)])
+        assert recovered == addresses
+        cache.pool.shutdown()
+        results[f'batch_{workers}w'] = args.pairs / elapsed
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{args.pairs} signatures, chunks of {args.chunk}")
+    for name, rate in results.items():
+        print(f"  {name:<12} {rate:10.0f} recoveries/s  ({rate / results['inline']:.1f}x inline)")
+
+
+if __name__ == '__main__':
+    main()
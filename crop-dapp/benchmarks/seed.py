@@ -0,0 +1,162 @@
+"""Seed a synthetic crop-dapp database for benchmarking.
+
+Creates the schema and default users (admin, inspector and retailer keep their
+default passwords), a farmer, consumer and transporter login for the benchmark
+clients (password 'bench123'), then --products products spread over farmers,
+with inspections and retail sales for a fraction of them. Rows are generated
+from a fixed random seed and written with chunked Core inserts, so a 1M-product
+database takes minutes rather than hours and two seeds of the same scale are
+identical.
+
+    python benchmarks/seed.py --products 100000 --db /tmp/crop-bench.db
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ml_quality_model import FERTILIZER_WEIGHTS, IRRIGATION_WEIGHTS, QUALITY_WEIGHTS, SOIL_WEIGHTS  # noqa: E402
+from models import db, User, Product, QualityInspection, RetailSale  # noqa: E402
+from qr_store import qr_hash  # noqa: E402
+
+BENCH_PASSWORD = 'bench123'
+# (username, password) the suite logs in with, per role; the first three come from seed_default_users
+CREDENTIALS = {
+    'admin': ('admin', 'admin123'),
+    'inspector': ('inspector', 'inspector123'),
+    'retailer': ('retailer', 'retailer123'),
+    'farmer': ('bench_farmer', BENCH_PASSWORD),
+    'consumer': ('bench_consumer', BENCH_PASSWORD),
+    'transporter': ('bench_transporter', BENCH_PASSWORD),
+}
+
+
+def bench_app(db_path, **overrides):
+    """An app pointed at the benchmark database, with background work sized for load tests."""
+    from app import create_app
+    from config import load_config
+    config = load_config()
+    config.update({
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}',
+        'QR_STORE_DIR': os.path.join(os.path.dirname(os.path.abspath(db_path)), 'qr'),
+        'JOB_MAX_PENDING': 100000,
+    })
+    config.update(overrides)
+    return create_app(config)
+
+
+def product_count():
+    return db.session.query(db.func.count(Product.id)).scalar()
+
+
+def close_database():
+    """Fold the WAL back into the main file and close every connection, so the .db file can be copied alone."""
+    db.session.remove()
+    with db.engine.connect() as conn:
+        conn.exec_driver_sql('PRAGMA wal_checkpoint(TRUNCATE)')
+    db.engine.dispose()
+
+
+def _chunks(rows, size):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+def seed(products, farmers=None, transporters=50, consumers=200, inspect_ratio=0.5, sale_ratio=0.3,
+         chunk_size=10000, random_seed=42, progress=print):
+    """Fill an empty database; call inside an app context."""
+    from analytics import rebuild as rebuild_analytics
+    from migrations import upgrade_schema, seed_default_users
+    rng = random.Random(random_seed)
+    upgrade_schema()
+    seed_default_users()
+
+    # One real hash shared by every synthetic account keeps seeding independent of the hash cost
+    probe = User(username='-', role='-')
+    probe.set_password(BENCH_PASSWORD)
+    pwhash = probe.password_hash
+    farmers = farmers or max(1, products // 100)
+    users = [{'username': CREDENTIALS[role][0], 'role': role, 'password_hash': pwhash} for role in ('farmer', 'consumer', 'transporter')]
+    users += [{'username': f'farmer{i}', 'role': 'farmer', 'password_hash': pwhash} for i in range(farmers)]
+    users += [{'username': f'transporter{i}', 'role': 'transporter', 'password_hash': pwhash} for i in range(transporters)]
+    users += [{'username': f'consumer{i}', 'role': 'consumer', 'password_hash': pwhash} for i in range(consumers)]
+    for chunk in _chunks(users, chunk_size):
+        db.session.execute(db.insert(User), chunk)
+    db.session.commit()
+
+    ids = {role: [uid for uid, in db.session.query(User.id).filter_by(role=role)] for role in
+           ('farmer', 'transporter', 'inspector', 'retailer')}
+    fertilizers = list(FERTILIZER_WEIGHTS) + ['Unknown']
+    soils = list(SOIL_WEIGHTS)
+    irrigations = list(IRRIGATION_WEIGHTS)
+    qualities = [q.title() for q in QUALITY_WEIGHTS]
+    crops = ['Wheat', 'Rice', 'Maize', 'Millet', 'Tomato', 'Onion', 'Potato', 'Cotton', 'Soybean', 'Mustard']
+
+    started = time.perf_counter()
+    first_id = (db.session.query(db.func.max(Product.id)).scalar() or 0) + 1
+    for start in range(0, products, chunk_size):
+        n = min(chunk_size, products - start)
+        rows = [{
+            'name': f'{rng.choice(crops)} lot {start + i}',
+            'description': 'Synthetic benchmark product',
+            'quantity': rng.randint(10, 5000),
+            'quality': rng.choice(qualities),
+            'fertilizer': rng.choice(fertilizers),
+            'organic': rng.choice(('Organic', 'Inorganic')),
+            'soil': rng.choice(soils),
+            'irrigation': rng.choice(irrigations),
+            'farmer_id': rng.choice(ids['farmer']),
+            'assigned_transporter_id': rng.choice(ids['transporter']) if rng.random() < 0.4 else None,
+        } for i in range(n)]
+        db.session.execute(db.insert(Product), rows)
+        product_ids = range(first_id + start, first_id + start + n)
+        inspections = [{
+            'product_id': pid,
+            'inspector_id': rng.choice(ids['inspector']),
+            'grade': rng.choice(('A+', 'A', 'B', 'C', 'D')),
+            'certificate': 'Synthetic',
+            'ml_score': round(rng.random(), 2),
+            'comments': 'Synthetic inspection',
+        } for pid in product_ids if rng.random() < inspect_ratio]
+        if inspections:
+            db.session.execute(db.insert(QualityInspection), inspections)
+        sales = []
+        for pid in product_ids:
+            if rng.random() < sale_ratio:
+                price = float(rng.randint(20, 500))
+                qr_data = f'ProductID:{pid}|SalePrice:{price}|Details:bench'
+                sales.append({'product_id': pid, 'retailer_id': rng.choice(ids['retailer']),
+                              'sale_price': price, 'retail_details': 'bench',
+                              'qr_data': qr_data, 'qr_hash': qr_hash(qr_data)})
+        if sales:
+            db.session.execute(db.insert(RetailSale), sales)
+        db.session.commit()
+        if progress:
+            done = start + n
+            progress(f"  {done}/{products} products ({done / (time.perf_counter() - started):.0f}/s)")
+    # The Core inserts above bypass the ORM events that maintain the rollups
+    rebuild_analytics()
+    return product_count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--db', required=True, help="SQLite file to create (must not exist)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if os.path.exists(args.db):
+        parser.error(f"{args.db} already exists")
+    app = bench_app(args.db)
+    with app.app_context():
+        count = seed(args.products, random_seed=args.seed)
+        close_database()
+    print(f"Seeded {count} products into {args.db}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,329 @@
+"""Route and grading benchmark suite with a saved baseline and regression check.
+
+Seeds (once per scale, cached in the temp directory) a synthetic database with
+benchmarks/seed.py, copies it so every run starts from the same data, then
+  - drives the main routes through the Flask test client and/or a real waitress
+    server, logged in with the role each route expects,
+  - micro-benchmarks grade_crop, the vectorized grade_crops and grade-cache hits,
+and reports p50/p95/p99 latency and SQL queries per request for each.
+
+    python benchmarks/suite.py --products 10000 --save baseline.json
+    # ...change something...
+    python benchmarks/suite.py --products 10000 --compare baseline.json
+
+--compare exits 1 when a p50/p95 latency grew by more than --threshold
+(default 25%), queries per request went up, or a route started failing.
+Dashboards that list every product (/admin, /inspector, /retailer_dashboard)
+get slow at 1M products; narrow the run with --routes.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlencode
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from sqlalchemy import event  # noqa: E402
+
+from seed import CREDENTIALS, bench_app, close_database, product_count, seed  # noqa: E402
+from grade_cache import FEATURE_COLUMNS  # noqa: E402
+from models import db, Product  # noqa: E402
+
+# path and body are called with (rng, number of products)
+Route = namedtuple('Route', 'name role method path body expect')
+
+ROUTES = [
+    Route('consumer', 'consumer', 'GET', lambda rng, n: '/consumer', None, 200),
+    Route('admin', 'admin', 'GET', lambda rng, n: '/admin', None, 200),
+    Route('inspector', 'inspector', 'GET', lambda rng, n: '/inspector', None, 200),
+    Route('retailer_dashboard', 'retailer', 'GET', lambda rng, n: '/retailer_dashboard', None, 200),
+    Route('log_sale', 'retailer', 'POST', lambda rng, n: '/log_sale',
+          lambda rng, n: {'product_id': rng.randint(1, n), 'sale_price': rng.randint(20, 500), 'retail_details': 'bench'}, 202),
+    Route('record_product', 'farmer', 'POST', lambda rng, n: '/record_product',
+          lambda rng, n: {'name': 'Bench lot', 'quantity': rng.randint(10, 5000), 'quality': 'High', 'fertilizer': 'compost',
+                          'organic': 'Organic', 'soil': 'loamy', 'irrigation': 'drip'}, 200),
+    Route('ml_grade_preview', 'inspector', 'GET', lambda rng, n: f'/ml_grade_preview?product_id={rng.randint(1, n)}', None, 200),
+]
+
+
+class QueryCounter:
+    """Counts SQL statements issued by request threads (background job workers are left out)."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not threading.current_thread().name.startswith('job'):
+            with self._lock:
+                self.count += 1
+
+
+class TestClientDriver:
+    name = 'client'
+
+    def __init__(self, app):
+        self.app = app
+        self.clients = {}
+
+    def login(self, role):
+        client = self.app.test_client()
+        username, password = CREDENTIALS[role]
+        client.post('/login', data={'username': username, 'password': password})
+        self.clients[role] = client
+
+    def request(self, role, method, path, body):
+        response = self.clients[role].open(path, method=method, json=body)
+        response.get_data()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class WaitressDriver:
+    name = 'waitress'
+
+    def __init__(self, app, threads):
+        from waitress import create_server
+        self.server = create_server(app, host='127.0.0.1', port=0, threads=threads)
+        self.port = self.server.effective_port
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        self.cookies = {}
+        self.local = threading.local()
+
+    def _conn(self):
+        if not hasattr(self.local, 'conn'):
+            self.local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=600)
+        return self.local.conn
+
+    def login(self, role):
+        username, password = CREDENTIALS[role]
+        conn = self._conn()
+        conn.request('POST', '/login', body=urlencode({'username': username, 'password': password}),
+                     headers={'Content-Type': 'application/x-www-form-urlencoded'})
+        response = conn.getresponse()
+        response.read()
+        cookie = response.getheader('Set-Cookie') or ''
+        self.cookies[role] = cookie.split(';', 1)[0]
+
+    def request(self, role, method, path, body):
+        headers = {'Cookie': self.cookies[role]}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        conn = self._conn()
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+
+    def close(self):
+        # Let in-flight tasks finish before the trigger socket goes away
+        self.server.task_dispatcher.shutdown()
+        self.server.close()
+
+
+def percentiles(samples, scale):
+    ordered = sorted(samples)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] * scale
+    return {'p50': pct(50), 'p95': pct(95), 'p99': pct(99), 'mean': sum(ordered) / len(ordered) * scale}
+
+
+def bench_route(driver, counter, route, n_products, requests, warmup, concurrency, rng_seed):
+    rng = random.Random(rng_seed)
+    lock = threading.Lock()
+    for _ in range(warmup):
+        driver.request(route.role, route.method, route.path(rng, n_products), route.body and route.body(rng, n_products))
+    latencies, errors = [], [0]
+    calls = [(route.path(rng, n_products), route.body and route.body(rng, n_products)) for _ in range(requests)]
+
+    def worker(share):
+        local, failed = [], 0
+        for path, body in share:
+            started = time.perf_counter()
+            status = driver.request(route.role, route.method, path, body)
+            local.append(time.perf_counter() - started)
+            failed += status != route.expect
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    queries_before = counter.count
+    if concurrency <= 1:
+        worker(calls)
+    else:
+        threads = [threading.Thread(target=worker, args=(calls[i::concurrency],)) for i in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    result = {f'{k}_ms': v for k, v in percentiles(latencies, 1000).items()}
+    result.update(requests=requests, errors=errors[0], queries_per_request=(counter.count - queries_before) / requests)
+    return result
+
+
+def bench_grading(rows, batches):
+    from grade_cache import GradeCache
+    from ml_quality_model import grade_crop, grade_crops
+    per_batch = max(1, len(rows) // batches)
+    chunks = [rows[i:i + per_batch] for i in range(0, len(rows), per_batch)]
+    results = {}
+
+    def per_call(fn):
+        samples = []
+        for chunk in chunks:
+            started = time.perf_counter()
+            fn(chunk)
+            samples.append((time.perf_counter() - started) / len(chunk))
+        return {f'{k}_us': v for k, v in percentiles(samples, 1e6).items()}
+
+    results['grade_crop'] = per_call(lambda chunk: [grade_crop(*r) for r in chunk])
+    results['grade_crops'] = per_call(grade_crops)
+    cache = GradeCache(maxsize=len(rows) + 1)
+    cache.grade_many(rows)
+    results['grade_cache_hit'] = per_call(lambda chunk: [cache.grade_features(r) for r in chunk])
+    return results
+
+
+def prepare_database(products, workdir, rng_seed):
+    golden = os.path.join(tempfile.gettempdir(), f'crop-bench-{products}-{rng_seed}.db')
+    if not os.path.exists(golden):
+        print(f"Seeding {products} products into {golden} (cached for later runs)")
+        partial = golden + '.partial'
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(partial + suffix):
+                os.remove(partial + suffix)
+        app = bench_app(partial)
+        with app.app_context():
+            seed(products, random_seed=rng_seed)
+            close_database()
+        os.replace(partial, golden)
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(partial + suffix):
+                os.remove(partial + suffix)
+    path = os.path.join(workdir, 'bench.db')
+    shutil.copyfile(golden, path)
+    return path
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='crop-bench-')
+    db_path = prepare_database(args.products, workdir, args.seed)
+    app = bench_app(db_path)
+    routes = [r for r in ROUTES if not args.routes or r.name in args.routes.split(',')]
+    results = {}
+    with app.app_context():
+        n_products = product_count()
+        counter = QueryCounter()
+        event.listen(db.engine, 'before_cursor_execute', counter)
+        for mode in args.mode.split(','):
+            driver = TestClientDriver(app) if mode == 'client' else WaitressDriver(app, args.threads)
+            for role in {r.role for r in routes}:
+                driver.login(role)
+            for route in routes:
+                concurrency = args.concurrency if mode == 'waitress' else 1
+                result = bench_route(driver, counter, route, n_products, args.requests, args.warmup, concurrency, args.seed)
+                results[f'{mode}/{route.name}'] = result
+                print(f"  {mode + '/' + route.name:<30} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                      f"p99 {result['p99_ms']:8.2f} ms  {result['queries_per_request']:6.1f} q/req  {result['errors']} errors")
+            driver.close()
+        if not args.skip_grading:
+            rows = [tuple(r) for r in db.session.query(*(getattr(Product, c) for c in FEATURE_COLUMNS)).limit(args.grading_rows)]
+            for name, result in bench_grading(rows, args.grading_batches).items():
+                results[f'grading/{name}'] = result
+                print(f"  {'grading/' + name:<30} p50 {result['p50_us']:8.3f} us  p95 {result['p95_us']:8.3f} us  p99 {result['p99_us']:8.3f} us")
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'meta': {
+            'products': n_products, 'requests': args.requests, 'warmup': args.warmup, 'mode': args.mode,
+            'concurrency': args.concurrency, 'threads': args.threads, 'seed': args.seed, 'git': git_revision(),
+            'python': platform.python_version(), 'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """Print a side-by-side table; returns the list of regressions."""
+    regressions = []
+    print(f"\ncompared with baseline from {baseline['meta'].get('time')} (git {baseline['meta'].get('git')})")
+    for key, cur in current['results'].items():
+        base = baseline['results'].get(key)
+        if base is None:
+            continue
+        unit = 'ms' if 'p50_ms' in cur else 'us'
+        notes = []
+        for stat in ('p50', 'p95'):
+            b, c = base[f'{stat}_{unit}'], cur[f'{stat}_{unit}']
+            if b > 0 and c > b * (1 + threshold):
+                notes.append(f"{stat} +{(c / b - 1) * 100:.0f}%")
+        if cur.get('queries_per_request', 0) > base.get('queries_per_request', 0) + 0.5:
+            notes.append(f"queries {base['queries_per_request']:.1f} -> {cur['queries_per_request']:.1f}")
+        if cur.get('errors', 0) > base.get('errors', 0):
+            notes.append(f"errors {base['errors']} -> {cur['errors']}")
+        b95, c95 = base[f'p95_{unit}'], cur[f'p95_{unit}']
+        change = f"{(c95 / b95 - 1) * 100:+6.0f}%" if b95 else '   n/a'
+        print(f"  {key:<30} p95 {b95:9.2f} -> {c95:9.2f} {unit} {change}  {'REGRESSION: ' + ', '.join(notes) if notes else 'ok'}")
+        if notes:
+            regressions.append((key, notes))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=10000, help="scale of the seeded database (e.g. 10000, 100000, 1000000)")
+    parser.add_argument('--mode', default='client,waitress', help="comma-separated: client, waitress")
+    parser.add_argument('--routes', help="comma-separated route names (default: all)")
+    parser.add_argument('--requests', type=int, default=20, help="timed requests per route")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=1, help="client threads in waitress mode")
+    parser.add_argument('--threads', type=int, default=4, help="waitress worker threads")
+    parser.add_argument('--grading-rows', type=int, default=20000)
+    parser.add_argument('--grading-batches', type=int, default=200)
+    parser.add_argument('--skip-grading', action='store_true')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help="write the results as a JSON baseline")
+    parser.add_argument('--compare', help="baseline JSON to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed latency growth before flagging (fraction)")
+    args = parser.parse_args()
+
+    current = run(args)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"saved {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
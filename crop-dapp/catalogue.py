@@ -0,0 +1,62 @@
+from collections import namedtuple
+
+from sqlalchemy import exists, func, select
+from sqlalchemy.orm import aliased
+
+from models import db, User, Product, QualityInspection, RetailSale
+
+CatalogueEntry = namedtuple('CatalogueEntry', 'product farmer sale retailer inspection')
+
+
+def latest_sale_id():
+    # Correlated MAX(id) per product, answered from the retail_sale.product_id index
+    return select(func.max(RetailSale.id)).where(RetailSale.product_id == Product.id).correlate(Product).scalar_subquery()
+
+
+def latest_inspection_id():
+    return select(func.max(QualityInspection.id)).where(QualityInspection.product_id == Product.id).correlate(Product).scalar_subquery()
+
+
+def consumer_catalogue(after_id=0, limit=24):
+    """One page of products that have been sold, with their latest sale and inspection.
+
+    Filtering happens in SQL (EXISTS on retail_sale) and only the latest sale and
+    latest inspection are joined, so each product yields exactly one row. Pages are
+    keyed on product id: pass the last id of the previous page as `after_id`.
+    Returns (entries, next_after_id) where next_after_id is None on the last page.
+    """
+    return _catalogue_page(after_id, limit, sold_only=True)
+
+
+def retailer_catalogue(after_id=0, limit=24):
+    """Like consumer_catalogue, but every product, with sale and retailer None until it is sold."""
+    return _catalogue_page(after_id, limit, sold_only=False)
+
+
+def _catalogue_page(after_id, limit, sold_only):
+    farmer = aliased(User)
+    retailer = aliased(User)
+    query = db.session.query(Product, farmer, RetailSale, retailer, QualityInspection).join(
+        farmer, farmer.id == Product.farmer_id
+    )
+    if sold_only:
+        query = query.join(
+            RetailSale, RetailSale.id == latest_sale_id()
+        ).join(
+            retailer, retailer.id == RetailSale.retailer_id
+        ).filter(
+            exists().where(RetailSale.product_id == Product.id).correlate(Product)
+        )
+    else:
+        query = query.outerjoin(
+            RetailSale, RetailSale.id == latest_sale_id()
+        ).outerjoin(
+            retailer, retailer.id == RetailSale.retailer_id
+        )
+    rows = query.outerjoin(
+        QualityInspection, QualityInspection.id == latest_inspection_id()
+    ).filter(Product.id > after_id).order_by(Product.id).limit(limit + 1).all()
+
+    entries = [CatalogueEntry(*row) for row in rows[:limit]]
+    next_after_id = entries[-1].product.id if len(rows) > limit else None
+    return entries, next_after_id
@@ -0,0 +1,180 @@
+import argparse
+import logging
+import os
+import time
+
+from eth_utils import event_abi_to_log_topic
+from web3 import Web3
+
+from abis import load_abi
+from models import db, ChainCrop, ChainTransport, ChainInspection, IndexerCheckpoint
+from sql_utils import upsert
+
+log = logging.getLogger(__name__)
+
+
+def _crop_row(args):
+    return {
+        'id': args['id'],
+        'farmer_address': args['farmer'],
+        'name': args['name'],
+        'details': args['details'],
+        'price': str(args['price']),
+        'quantity': str(args['quantity']),
+        'quality': args['quality'],
+        'fertilizer': args['fertilizer'],
+        'organic': args['organic'],
+        'soil': args['soil'],
+        'irrigation': args['irrigation'],
+    }
+
+
+def _transport_row(args):
+    return {
+        'id': args['recordId'],
+        'crop_id': args['cropId'],
+        'transporter_address': args['transporter'],
+        'location': args['location'],
+        'custody': args['custody'],
+        'timestamp': args['timestamp'],
+    }
+
+
+def _inspection_row(args):
+    return {
+        'id': args['inspectionId'],
+        'product_id': args['productId'],
+        'inspector_address': args['inspector'],
+        'score': args['score'],
+        'grade': args['grade'],
+        'certificate': args['certificate'],
+        'comments': args['comments'],
+        'timestamp': args['timestamp'],
+    }
+
+
+class EventSource:
+    """One contract event mirrored into one table.
+
+    `to_row` maps the decoded event args to column values; the on-chain record
+    id becomes the primary key, so re-indexing a block range is idempotent.
+    """
+
+    def __init__(self, name, address, abi, event, model, to_row):
+        self.name = name
+        self.address = Web3.to_checksum_address(address)
+        self.abi = abi
+        self.event = event
+        self.model = model
+        self.to_row = to_row
+        self.event_abi = next(e for e in abi if e.get('type') == 'event' and e['name'] == event)
+        self.topic = event_abi_to_log_topic(self.event_abi)
+
+
+def default_sources(config):
+    """The three registries, using the app's ABIs and configured contract addresses."""
+    return [
+        EventSource('crop_registry', config['CONTRACT_ADDRESS'], load_abi('crop'),
+                    'CropAdded', ChainCrop, _crop_row),
+        EventSource('transporter_registry', config['TRANSPORTER_CONTRACT_ADDRESS'], load_abi('transporter'),
+                    'TransportUpdated', ChainTransport, _transport_row),
+        EventSource('quality_inspection_registry', config['QUALITY_INSPECTION_CONTRACT_ADDRESS'], load_abi('quality_inspection'),
+                    'InspectionRecorded', ChainInspection, _inspection_row),
+    ]
+
+
+class ChainIndexer:
+    """Follows contract events in block ranges and upserts them into SQL.
+
+    Each source keeps its own checkpoint (last fully indexed block). A range is
+    fetched with one eth_getLogs call, decoded with the contract ABI, upserted,
+    and committed together with the advanced checkpoint, so a crash mid-run
+    resumes from the last committed range. Blocks newer than head - confirmations
+    are left for a later pass to stay clear of shallow reorgs.
+    """
+
+    def __init__(self, w3, sources, batch_blocks=2000, confirmations=3, start_block=0):
+        self.w3 = w3
+        self.sources = sources
+        self.batch_blocks = batch_blocks
+        self.confirmations = confirmations
+        self.start_block = start_block
+
+    def checkpoint(self, source):
+        cp = db.session.get(IndexerCheckpoint, source.name)
+        if cp is None or cp.address.lower() != source.address.lower():
+            # New contract (or redeployed to a new address): start over
+            return self.start_block - 1
+        return cp.last_block
+
+    def run_once(self):
+        """Index every source up to the confirmed head. Returns the number of events stored."""
+        head = self.w3.eth.block_number - self.confirmations
+        total = 0
+        for source in self.sources:
+            contract = self.w3.eth.contract(address=source.address, abi=source.abi)
+            event = getattr(contract.events, source.event)()
+            block = self.checkpoint(source) + 1
+            while block <= head:
+                to_block = min(block + self.batch_blocks - 1, head)
+                logs = self.w3.eth.get_logs({
+                    'address': source.address,
+                    'fromBlock': block,
+                    'toBlock': to_block,
+                    'topics': [Web3.to_hex(source.topic)],
+                })
+                rows = []
+                for entry in logs:
+                    decoded = event.process_log(entry)
+                    row = source.to_row(decoded['args'])
+                    row['block_number'] = decoded['blockNumber']
+                    row['tx_hash'] = Web3.to_hex(decoded['transactionHash'])
+                    row['log_index'] = decoded['logIndex']
+                    rows.append(row)
+                conn = db.session.connection()
+                upsert(conn, source.model.__table__, rows, ['id'])
+                upsert(conn, IndexerCheckpoint.__table__,
+                       [{'name': source.name, 'address': source.address, 'last_block': to_block}], ['name'])
+                db.session.commit()
+                total += len(rows)
+                log.info("%s: blocks %d-%d, %d events", source.name, block, to_block, len(rows))
+                block = to_block + 1
+        return total
+
+    def run_forever(self, poll_interval=5.0):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                db.session.rollback()
+                log.exception("indexer pass failed, retrying")
+            time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mirror registry contract events into the local database")
+    parser.add_argument('--rpc', default=os.environ.get('WEB3_PROVIDER_URL', 'http://127.0.0.1:8545'))
+    parser.add_argument('--once', action='store_true', help="index up to the current head and exit")
+    parser.add_argument('--batch-blocks', type=int, default=int(os.environ.get('INDEXER_BATCH_BLOCKS', '2000')))
+    parser.add_argument('--confirmations', type=int, default=int(os.environ.get('INDEXER_CONFIRMATIONS', '3')))
+    parser.add_argument('--start-block', type=int, default=int(os.environ.get('INDEXER_START_BLOCK', '0')))
+    parser.add_argument('--poll-interval', type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    from app import create_app
+    from migrations import upgrade_schema
+    app = create_app()
+    w3 = Web3(Web3.HTTPProvider(args.rpc))
+    with app.app_context():
+        upgrade_schema()
+        indexer = ChainIndexer(w3, default_sources(app.config), batch_blocks=args.batch_blocks,
+                               confirmations=args.confirmations, start_block=args.start_block)
+        if args.once:
+            print(f"Indexed {indexer.run_once()} events")
+        else:
+            indexer.run_forever(args.poll_interval)
+
+
+if __name__ == '__main__':
+    main()
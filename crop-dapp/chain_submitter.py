@@ -0,0 +1,402 @@
+import argparse
+import json
+import logging
+import threading
+import time
+
+from sqlalchemy import exists, func, insert, or_, select, update
+
+from jobs import job_queue
+from models import db, Product, QualityInspection, RetailSale, ChainBatch, ChainBatchItem
+
+log = logging.getLogger(__name__)
+
+# entity -> (model, columns hashed into the record's leaf, product id column for trace invalidation)
+ENTITIES = {
+    'product': (Product, ('id', 'farmer_id', 'name', 'quantity', 'quality', 'fertilizer', 'organic', 'soil', 'irrigation'), Product.id),
+    'inspection': (QualityInspection, ('id', 'product_id', 'inspector_id', 'grade', 'certificate', 'ml_score'), QualityInspection.product_id),
+    'sale': (RetailSale, ('id', 'product_id', 'retailer_id', 'sale_price', 'qr_hash'), RetailSale.product_id),
+}
+OPEN = ('signed', 'sent')
+# Receipt lookup result for a batch whose nonce was spent by another transaction
+DROPPED = 'dropped'
+
+
+class ChainSubmitError(Exception):
+    pass
+
+
+def record_leaf(entity, row):
+    """keccak256 of the compact JSON array [entity, *columns] of one record, as anchored on chain."""
+    from web3 import Web3
+    return Web3.keccak(text=json.dumps([entity, *row], separators=(',', ':')))
+
+
+def batch_calldata(leaves):
+    """abi.encode(bytes32 digest, bytes32[] leaves), digest being keccak256 of the concatenated leaves."""
+    from eth_abi import encode as abi_encode
+    from web3 import Web3
+    digest = Web3.keccak(b''.join(leaves))
+    return digest, abi_encode(['bytes32', 'bytes32[]'], [digest, leaves])
+
+
+def _mark_dirty(product_ids):
+    # Set-based UPDATEs skip the mapper events provenance listens to
+    if product_ids:
+        db.session.info.setdefault('trace_dirty', set()).update(product_ids)
+
+
+class NonceManager:
+    """Hands out consecutive nonces for one account without asking the node each time.
+
+    The counter is read from the node's pending transaction count on first use
+    and again after resync(), which the submitter calls whenever a send fails,
+    since a nonce that never reached the node would otherwise leave a gap that
+    stalls every later transaction.
+    """
+
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self._next = None
+        self._lock = threading.Lock()
+
+    def take(self):
+        with self._lock:
+            if self._next is None:
+                self._next = self.w3.eth.get_transaction_count(self.address, 'pending')
+            nonce = self._next
+            self._next += 1
+            return nonce
+
+    def resync(self):
+        with self._lock:
+            self._next = None
+
+
+class ChainSubmitter:
+    """Anchors products, inspections and retail sales on chain in batched transactions.
+
+    Records whose tx_hash is NULL and that no open batch has claimed are
+    collected, up to batch_size per transaction. Each record is reduced to a
+    32-byte leaf (record_leaf) and the batch is one transaction from the server
+    key to the anchor address whose calldata carries the leaves and their
+    digest, so one 21000-gas base cost covers the whole batch. The registries
+    only have per-item methods and no batch entry point, which is why batches
+    are anchored this way rather than by calling addCrop/recordInspection.
+
+    The transaction is signed locally with a nonce from NonceManager, stored
+    with its claimed records and committed before it is broadcast, so a crash at
+    any point leaves either nothing or a batch resume() can rebroadcast. The
+    receipt is awaited by a chain_receipt background job, which writes the
+    batch's tx hash onto its records; a reverted or dropped batch releases them
+    to be picked up by a later one. Batches left open for stale_after seconds
+    (their receipt job gave up) are settled or rebroadcast by each pass.
+    chain_receipt is registered by connect(), so only processes holding the
+    key run it. Run a single submitter process per key. Without
+    CHAIN_SUBMITTER_KEY the submitter is disabled and never imports web3.
+    """
+
+    def __init__(self):
+        self.w3 = None
+        self.account = None
+        self.anchor = None
+        self.nonces = None
+        self.batch_size = 200
+        self.max_in_flight = 16
+        self.receipt_timeout = 120.0
+        self.receipt_attempts = 5
+        self.stale_after = 900.0
+        self.enabled = False
+        self._config = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.batch_size = app.config.get('CHAIN_BATCH_SIZE', self.batch_size)
+        self.max_in_flight = app.config.get('CHAIN_MAX_IN_FLIGHT', self.max_in_flight)
+        self.receipt_timeout = app.config.get('CHAIN_RECEIPT_TIMEOUT', self.receipt_timeout)
+        self.receipt_attempts = app.config.get('CHAIN_RECEIPT_ATTEMPTS', self.receipt_attempts)
+        self.stale_after = app.config.get('CHAIN_STALE_AFTER', self.stale_after)
+        self._config = {k: app.config.get(k) for k in ('WEB3_PROVIDER_URL', 'CHAIN_SUBMITTER_KEY', 'CHAIN_ANCHOR_ADDRESS')}
+        # Without a key this process never connects, so web3 is never imported
+        self.enabled = bool(self._config['CHAIN_SUBMITTER_KEY'])
+
+    def connect(self, w3=None, key=None):
+        """Bind to a node (WEB3_PROVIDER_URL unless w3 is given) and the signing key (CHAIN_SUBMITTER_KEY)."""
+        key = key or self._config.get('CHAIN_SUBMITTER_KEY')
+        if not key:
+            raise ChainSubmitError("CHAIN_SUBMITTER_KEY is not set")
+        # web3 and eth_account are slow to import; only processes that anchor pay for them
+        from eth_account import Account
+        from web3 import Web3
+        with self._lock:
+            self.w3 = w3 or Web3(Web3.HTTPProvider(self._config.get('WEB3_PROVIDER_URL')))
+            self.account = Account.from_key(key)
+            # With no anchor contract the batch is sent to the key's own address; the calldata is what counts
+            self.anchor = Web3.to_checksum_address(self._config.get('CHAIN_ANCHOR_ADDRESS') or self.account.address)
+            self.nonces = NonceManager(self.w3, self.account.address)
+            self.chain_id = self.w3.eth.chain_id
+        job_queue.handler('chain_receipt')(self._receipt_job)
+        return self
+
+    def _connected(self):
+        if self.w3 is None:
+            if not self.enabled:
+                raise ChainSubmitError("chain submission is disabled: CHAIN_SUBMITTER_KEY is not set")
+            self.connect()
+
+    # ---------- submission ----------
+    def pending(self, limit):
+        """Up to limit (entity, row) pairs not yet anchored, products first, each entity in id order."""
+        items = []
+        for entity, (model, columns, _) in ENTITIES.items():
+            if len(items) >= limit:
+                break
+            claimed = exists().where(ChainBatchItem.entity == entity, ChainBatchItem.record_id == model.id)
+            rows = db.session.execute(
+                select(*(getattr(model, c) for c in columns))
+                .where(model.tx_hash.is_(None), ~claimed).order_by(model.id).limit(limit - len(items))
+            ).all()
+            items.extend((entity, tuple(row)) for row in rows)
+        return items
+
+    def in_flight(self):
+        return db.session.scalar(select(func.count(ChainBatch.id)).where(ChainBatch.status.in_(OPEN)))
+
+    def submit(self, items):
+        """Sign one batch transaction for items, record it, broadcast it and queue its receipt job."""
+        if not items:
+            return None
+        self._connected()
+        digest, data = batch_calldata([record_leaf(entity, row) for entity, row in items])
+        tx = {'to': self.anchor, 'value': 0, 'data': data, 'chainId': self.chain_id, 'gasPrice': self.w3.eth.gas_price}
+        tx['gas'] = self.w3.eth.estimate_gas({**tx, 'from': self.account.address})
+        tx['nonce'] = self.nonces.take()
+        signed = self.account.sign_transaction(tx)
+        batch = ChainBatch(nonce=tx['nonce'], tx_hash=signed.hash.to_0x_hex(), raw_tx=signed.raw_transaction.to_0x_hex(),
+                           digest=digest.to_0x_hex(), items=len(items), status='signed', checked_at=time.time())
+        try:
+            db.session.add(batch)
+            db.session.flush()
+            db.session.execute(insert(ChainBatchItem), [
+                {'entity': entity, 'record_id': row[0], 'batch_id': batch.id} for entity, row in items
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self.nonces.resync()
+            raise
+        self._broadcast(batch)
+        return batch
+
+    def _broadcast(self, batch):
+        try:
+            self.w3.eth.send_raw_transaction(batch.raw_tx)
+        except Exception as exc:
+            # The node never took this nonce: give the records back and re-read the nonce from the node
+            self.nonces.resync()
+            self._release(batch, f"send failed: {exc}")
+            db.session.commit()
+            raise ChainSubmitError(f"batch {batch.id} was not accepted: {exc}") from exc
+        batch.status = 'sent'
+        job_queue.enqueue('chain_receipt', {'batch_id': batch.id}, max_attempts=self.receipt_attempts)
+        db.session.commit()
+        log.info("batch %d: %d records, nonce %d, %s", batch.id, batch.items, batch.nonce, batch.tx_hash)
+
+    def run_once(self):
+        """Submit full batches, then one partial batch, while fewer than max_in_flight are unconfirmed.
+
+        Returns the number of records sent.
+        """
+        self.recheck_stale()
+        sent = 0
+        while self.in_flight() < self.max_in_flight and not job_queue.full():
+            items = self.pending(self.batch_size)
+            if not items:
+                break
+            self.submit(items)
+            sent += len(items)
+            if len(items) < self.batch_size:
+                break
+        return sent
+
+    def run_forever(self, interval=5.0):
+        # Records arriving between passes are coalesced into the next pass' batches
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                db.session.rollback()
+                log.exception("submission pass failed, retrying")
+            finally:
+                # End the read transaction so the next pass sees what the receipt jobs committed
+                db.session.close()
+            time.sleep(interval)
+
+    def resume(self):
+        """Rebroadcast every open batch left by a previous process.
+
+        A batch that was already mined or is still in the node's pool makes the
+        node refuse the rebroadcast, which is expected. Batches that never got
+        as far as 'sent' get a receipt job here; the receipt jobs of the others
+        are adopted from the dead process by job_queue.resume() once their
+        lease expires, and recheck_stale() covers any whose job is gone.
+        """
+        self._connected()
+        batches = db.session.query(ChainBatch).filter(ChainBatch.status.in_(OPEN)).order_by(ChainBatch.nonce).all()
+        for batch in batches:
+            self._rebroadcast(batch)
+            if batch.status == 'signed':
+                batch.status = 'sent'
+                job_queue.enqueue('chain_receipt', {'batch_id': batch.id}, max_attempts=self.receipt_attempts)
+        db.session.commit()
+        self.nonces.resync()
+        job_queue.resume()
+        return len(batches)
+
+    def _rebroadcast(self, batch):
+        try:
+            self.w3.eth.send_raw_transaction(batch.raw_tx)
+        except Exception as exc:
+            log.info("batch %d not rebroadcast: %s", batch.id, exc)
+        batch.checked_at = time.time()
+
+    def recheck_stale(self):
+        """Settle or rebroadcast open batches that have gone unchecked for stale_after seconds.
+
+        This is what ends batches whose receipt job used up its attempts: a
+        mined one is settled, one whose nonce went to another transaction
+        releases its records, and one that can still be mined is rebroadcast
+        and looked at again stale_after seconds later. Returns the number settled.
+        """
+        self._connected()
+        cutoff = time.time() - self.stale_after
+        batches = db.session.query(ChainBatch).filter(
+            ChainBatch.status.in_(OPEN), or_(ChainBatch.checked_at.is_(None), ChainBatch.checked_at < cutoff)
+        ).order_by(ChainBatch.nonce).all()
+        settled = 0
+        for batch in batches:
+            receipt = self._poll(batch)
+            if receipt is None:
+                self._rebroadcast(batch)
+            else:
+                self._settle(batch, receipt)
+                settled += 1
+        db.session.commit()
+        return settled
+
+    # ---------- receipts ----------
+    def _receipt_job(self, payload):
+        return self.confirm(payload['batch_id'])
+
+    def confirm(self, batch_id):
+        """Wait for a batch's receipt and settle it; the caller commits.
+
+        Raises TimeExhausted while the batch can still be mined, so the job is retried.
+        """
+        from web3.exceptions import TimeExhausted
+        self._connected()
+        batch = db.session.get(ChainBatch, batch_id)
+        if batch is None or batch.status not in OPEN:
+            return {'batch_id': batch_id, 'status': batch.status if batch else None}
+        try:
+            receipt = self.w3.eth.wait_for_transaction_receipt(batch.tx_hash, timeout=self.receipt_timeout)
+        except TimeExhausted:
+            receipt = self._poll(batch)
+            if receipt is None:
+                raise
+        return self._settle(batch, receipt)
+
+    def _poll(self, batch):
+        """The batch's receipt, None while it can still be mined, or DROPPED once its nonce went to another transaction."""
+        from web3.exceptions import TransactionNotFound
+        try:
+            return self.w3.eth.get_transaction_receipt(batch.tx_hash)
+        except TransactionNotFound:
+            pass
+        if self.w3.eth.get_transaction_count(self.account.address) <= batch.nonce:
+            return None
+        try:
+            # Mined between the two lookups
+            return self.w3.eth.get_transaction_receipt(batch.tx_hash)
+        except TransactionNotFound:
+            return DROPPED
+
+    def _settle(self, batch, receipt):
+        """Write a mined batch's tx hash onto every record it anchored that has none yet;
+        release the records of a reverted or dropped one."""
+        if receipt == DROPPED:
+            self._release(batch, f"nonce {batch.nonce} was used by another transaction")
+            return {'batch_id': batch.id, 'status': batch.status}
+        if receipt['status'] != 1:
+            self._release(batch, f"reverted in block {receipt['blockNumber']}")
+            return {'batch_id': batch.id, 'status': batch.status}
+        for entity, (model, _, product_column) in ENTITIES.items():
+            ids = select(ChainBatchItem.record_id).where(ChainBatchItem.batch_id == batch.id, ChainBatchItem.entity == entity)
+            db.session.execute(
+                update(model).where(model.id.in_(ids), model.tx_hash.is_(None)).values(tx_hash=batch.tx_hash),
+                execution_options={'synchronize_session': False}
+            )
+            _mark_dirty(set(db.session.scalars(select(product_column).where(model.id.in_(ids)))))
+        batch.status = 'confirmed'
+        batch.block_number = receipt['blockNumber']
+        batch.gas_used = receipt['gasUsed']
+        batch.confirmed_at = func.now()
+        return {'batch_id': batch.id, 'status': 'confirmed', 'block_number': batch.block_number, 'items': batch.items}
+
+    def _release(self, batch, error):
+        db.session.execute(ChainBatchItem.__table__.delete().where(ChainBatchItem.batch_id == batch.id))
+        batch.status = 'failed'
+        batch.error = error
+        log.warning("batch %d failed: %s", batch.id, error)
+
+    def stats(self):
+        batches = dict(db.session.query(ChainBatch.status, func.count(ChainBatch.id)).group_by(ChainBatch.status).all())
+        pending = {
+            entity: db.session.scalar(select(func.count(model.id)).where(
+                model.tx_hash.is_(None),
+                ~exists().where(ChainBatchItem.entity == entity, ChainBatchItem.record_id == model.id)
+            ))
+            for entity, (model, _, _) in ENTITIES.items()
+        }
+        return {'enabled': self.enabled or self.w3 is not None, 'batches': batches, 'pending': pending,
+                'batch_size': self.batch_size, 'max_in_flight': self.max_in_flight,
+                'account': self.account.address if self.account else None}
+
+
+chain_submitter = ChainSubmitter()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anchor unanchored products, inspections and sales on chain in batches")
+    parser.add_argument('--once', action='store_true', help="submit what is pending, wait for the receipts and exit")
+    parser.add_argument('--batch-size', type=int, help="records per transaction (default CHAIN_BATCH_SIZE)")
+    parser.add_argument('--interval', type=float, help="seconds between passes (default CHAIN_BATCH_INTERVAL)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    from app import create_app
+    from migrations import upgrade_schema
+    app = create_app()
+    with app.app_context():
+        upgrade_schema()
+        chain_submitter.connect()
+        if args.batch_size:
+            chain_submitter.batch_size = args.batch_size
+        print(f"Resumed {chain_submitter.resume()} open batches")
+        if args.once:
+            sent = 0
+            while True:
+                n = chain_submitter.run_once()
+                db.session.close()
+                sent += n
+                if not n and not job_queue.stats()['in_flight']:
+                    break
+                time.sleep(1)
+            print(f"Anchored {sent} records")
+        else:
+            chain_submitter.run_forever(args.interval or app.config['CHAIN_BATCH_INTERVAL'])
+
+
+if __name__ == '__main__':
+    main()
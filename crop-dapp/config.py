@@ -0,0 +1,111 @@
+import os
+
+
+def load_config():
+    """App settings from the environment (.env is loaded by app.py before this runs)."""
+    env = os.environ.get
+    return {
+        'SQLALCHEMY_DATABASE_URI': env('DATABASE_URL', 'sqlite:///crop_app.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        'SECRET_KEY': env('FLASK_SECRET', 'supersecretkey'),
+
+        # Engine profile: 'sqlite', 'postgres' or 'default'; picked from the database URL when unset
+        'DB_PROFILE': env('DB_PROFILE'),
+        # Connection pool, sized for waitress' threads plus the background job workers
+        'DB_POOL_SIZE': int(env('DB_POOL_SIZE', '8')),
+        'DB_MAX_OVERFLOW': int(env('DB_MAX_OVERFLOW', '8')),
+        'DB_POOL_TIMEOUT': int(env('DB_POOL_TIMEOUT', '30')),
+        'DB_POOL_RECYCLE': int(env('DB_POOL_RECYCLE', '1800')),
+        # sqlite profile: how long a writer waits for the lock, memory-mapped I/O size and page cache size
+        'SQLITE_BUSY_TIMEOUT_MS': int(env('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        'SQLITE_MMAP_SIZE': int(env('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'SQLITE_CACHE_KB': int(env('SQLITE_CACHE_KB', '20000')),
+
+        # Request/SQL/template metrics at /metrics (off unless INSTRUMENTATION=1); a bearer token lets
+        # scrapers in without an admin session; statements repeated this often in one request count as N+1
+        'INSTRUMENTATION': env('INSTRUMENTATION', '0') == '1',
+        'METRICS_TOKEN': env('METRICS_TOKEN'),
+        'N_PLUS_ONE_THRESHOLD': int(env('N_PLUS_ONE_THRESHOLD', '10')),
+        'PROFILER_INTERVAL_MS': float(env('PROFILER_INTERVAL_MS', '5')),
+
+        # Password hashing: werkzeug method string (e.g. 'scrypt', 'scrypt:65536:8:1', 'pbkdf2:sha256:600000'),
+        # worker processes (0 hashes inline), logins queued before /login answers 429, seconds to wait for a result
+        'PASSWORD_HASH_METHOD': env('PASSWORD_HASH_METHOD', 'scrypt'),
+        'PASSWORD_HASH_WORKERS': int(env('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1)))),
+        'PASSWORD_HASH_MAX_PENDING': int(env('PASSWORD_HASH_MAX_PENDING', '32')),
+        'PASSWORD_HASH_TIMEOUT': float(env('PASSWORD_HASH_TIMEOUT', '10')),
+
+        # Wallet signature recovery: cached (message, signature) pairs, /link_wallets worker processes,
+        # chunks queued before it answers 429, pairs per worker task, pairs accepted per request
+        'WALLET_CACHE_SIZE': int(env('WALLET_CACHE_SIZE', '10000')),
+        'WALLET_RECOVERY_WORKERS': int(env('WALLET_RECOVERY_WORKERS', str(min(4, os.cpu_count() or 1)))),
+        'WALLET_RECOVERY_MAX_PENDING': int(env('WALLET_RECOVERY_MAX_PENDING', '64')),
+        'WALLET_RECOVERY_CHUNK': int(env('WALLET_RECOVERY_CHUNK', '64')),
+        'WALLET_BATCH_LIMIT': int(env('WALLET_BATCH_LIMIT', '2000')),
+
+        # Deployed registry contracts
+        'CONTRACT_ADDRESS': env('CONTRACT_ADDRESS', '0x61eedc5753741826a3f29236f9675460c9a9342e'),
+        'TRANSPORTER_CONTRACT_ADDRESS': env('TRANSPORTER_CONTRACT_ADDRESS', '0x913c828e417c1fa7d2cd33f1ef9240011bafef1c'),
+        'QUALITY_INSPECTION_CONTRACT_ADDRESS': env('QUALITY_INSPECTION_CONTRACT_ADDRESS', '0x39e4b7d3729642c3289007dfbdc5adb8bd73c817'),
+
+        # Server-side batched anchoring (chain_submitter.py): node URL, signing key, batch destination
+        # (the key's own address when unset), records per transaction, seconds between passes,
+        # unconfirmed batches allowed at once, seconds per receipt wait and receipt job attempts, and seconds
+        # an open batch goes unchecked before a pass settles or rebroadcasts it (outlasts the receipt job)
+        'WEB3_PROVIDER_URL': env('WEB3_PROVIDER_URL', 'http://127.0.0.1:8545'),
+        'CHAIN_SUBMITTER_KEY': env('CHAIN_SUBMITTER_KEY'),
+        'CHAIN_ANCHOR_ADDRESS': env('CHAIN_ANCHOR_ADDRESS'),
+        'CHAIN_BATCH_SIZE': int(env('CHAIN_BATCH_SIZE', '200')),
+        'CHAIN_BATCH_INTERVAL': float(env('CHAIN_BATCH_INTERVAL', '5')),
+        'CHAIN_MAX_IN_FLIGHT': int(env('CHAIN_MAX_IN_FLIGHT', '16')),
+        'CHAIN_RECEIPT_TIMEOUT': float(env('CHAIN_RECEIPT_TIMEOUT', '120')),
+        'CHAIN_RECEIPT_ATTEMPTS': int(env('CHAIN_RECEIPT_ATTEMPTS', '5')),
+        'CHAIN_STALE_AFTER': float(env('CHAIN_STALE_AFTER', '900')),
+
+        # ML grade cache: in-memory LRU size and whether grades are also stored in the ml_grade_cache table
+        'GRADE_CACHE_SIZE': int(env('GRADE_CACHE_SIZE', '4096')),
+        'GRADE_CACHE_PERSIST': env('GRADE_CACHE_PERSIST', '1') == '1',
+        # Upper bound on products graded by one /ml_grade_batch call
+        'ML_GRADE_BATCH_LIMIT': int(env('ML_GRADE_BATCH_LIMIT', '5000')),
+
+        # Directory for content-addressed QR PNGs (defaults to <instance>/qr)
+        'QR_STORE_DIR': env('QR_STORE_DIR'),
+        # QR images never change for a given hash, so browsers may keep them for a year
+        'QR_CACHE_MAX_AGE': 31536000,
+
+        # Content-hashed ABI and static URLs (?v=<hash>) are immutable for this long
+        'ASSET_CACHE_MAX_AGE': int(env('ASSET_CACHE_MAX_AGE', '31536000')),
+
+        # Background jobs: worker threads, max jobs in flight before /log_sale sheds load, retries per job,
+        # and seconds a job stays leased to its process without a heartbeat before another process adopts it
+        'JOB_WORKERS': int(env('JOB_WORKERS', '2')),
+        'JOB_MAX_PENDING': int(env('JOB_MAX_PENDING', '200')),
+        'JOB_MAX_ATTEMPTS': int(env('JOB_MAX_ATTEMPTS', '3')),
+        'JOB_LEASE_SECONDS': int(env('JOB_LEASE_SECONDS', '60')),
+
+        # /trace response cache: entries kept and seconds before an entry is rebuilt regardless of writes
+        'TRACE_CACHE_SIZE': int(env('TRACE_CACHE_SIZE', '2048')),
+        'TRACE_CACHE_TTL': int(env('TRACE_CACHE_TTL', '300')),
+
+        # Logged-in user snapshots: entries kept and seconds before one is re-read
+        'IDENTITY_CACHE_SIZE': int(env('IDENTITY_CACHE_SIZE', '10000')),
+        'IDENTITY_CACHE_TTL': int(env('IDENTITY_CACHE_TTL', '60')),
+
+        # Products per consumer/retailer catalogue page
+        'CATALOGUE_PAGE_SIZE': int(env('CATALOGUE_PAGE_SIZE', '24')),
+        # Rows per page of the /api/* lists by default, and the most a client may ask for
+        'API_PAGE_SIZE': int(env('API_PAGE_SIZE', '50')),
+        'API_PAGE_MAX': int(env('API_PAGE_MAX', '200')),
+        # Ids accepted by one bulk admin call (assign, deactivate, delete)
+        'ADMIN_BULK_LIMIT': int(env('ADMIN_BULK_LIMIT', '5000')),
+
+        # Rows per committed chunk of `flask backfill`
+        'BACKFILL_CHUNK_SIZE': int(env('BACKFILL_CHUNK_SIZE', '1000')),
+
+        # Rows fetched per round trip by /export and `flask export`
+        'EXPORT_CHUNK_SIZE': int(env('EXPORT_CHUNK_SIZE', '1000')),
+
+        # Bulk product ingestion: rows per INSERT batch and rows accepted per request
+        'BULK_INSERT_CHUNK_SIZE': int(env('BULK_INSERT_CHUNK_SIZE', '500')),
+        'BULK_PRODUCT_LIMIT': int(env('BULK_PRODUCT_LIMIT', '50000')),
+    }
@@ -0,0 +1,73 @@
+from sqlalchemy import event
+
+from models import db
+
+# Engine profiles selectable with DB_PROFILE. 'default' leaves SQLAlchemy's own settings.
+PROFILES = ('default', 'sqlite', 'postgres')
+
+
+def detect_profile(uri):
+    if uri.startswith('sqlite'):
+        return 'sqlite'
+    if uri.startswith(('postgresql', 'postgres')):
+        return 'postgres'
+    return 'default'
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured profile."""
+    profile = config['DB_PROFILE'] or detect_profile(config['SQLALCHEMY_DATABASE_URI'])
+    if profile not in PROFILES:
+        raise ValueError(f"unknown DB_PROFILE {profile!r}, expected one of {', '.join(PROFILES)}")
+    if profile == 'sqlite':
+        uri = config['SQLALCHEMY_DATABASE_URI']
+        if uri in ('sqlite://', 'sqlite:///:memory:'):
+            # In-memory databases live in a single connection; keep SQLAlchemy's singleton pool
+            return {}
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'connect_args': {
+                # pysqlite's own lock wait, in seconds; the busy_timeout pragma below matches it
+                'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+                # pooled connections are handed between waitress threads, one at a time
+                'check_same_thread': False,
+            },
+        }
+    if profile == 'postgres':
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': True,
+        }
+    return {}
+
+
+def init_app(app):
+    """Apply per-connection settings for the sqlite profile (call after db.init_app)."""
+    profile = app.config['DB_PROFILE'] or detect_profile(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['DB_PROFILE'] = profile
+    if profile != 'sqlite':
+        return
+    pragmas = (
+        # Readers no longer block the writer and vice versa; writers still take turns
+        ('journal_mode', 'WAL'),
+        # With WAL, NORMAL only fsyncs at checkpoints; a power loss can drop the last commits but never corrupts
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', app.config['SQLITE_BUSY_TIMEOUT_MS']),
+        ('mmap_size', app.config['SQLITE_MMAP_SIZE']),
+        ('cache_size', -app.config['SQLITE_CACHE_KB']),
+        ('temp_store', 'MEMORY'),
+    )
+
+    def set_pragmas(dbapi_conn, connection_record):
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_pragmas)
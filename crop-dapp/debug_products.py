@@ -1,10 +1,13 @@
-from models import db, Product
-from app import app
+from app import create_app
+from export import export_query, iter_rows
+
+app = create_app()
 
 with app.app_context():
-    # Print all products and their fields for debugging
-    products = Product.query.all()
-    for p in products:
+    # Print all products and their fields for debugging, streamed so the table is never loaded whole
+    rows = iter_rows(export_query('products'))
+    next(rows)  # column names
+    for p in rows:
         print(f"ID: {p.id}, Name: {p.name}, Fertilizer: {p.fertilizer}, Organic: {p.organic}, Soil: {p.soil}, Irrigation: {p.irrigation}, Quantity: {p.quantity}, Quality: {p.quality}")
         # Check for missing or problematic fields
         missing = []
@@ -0,0 +1,133 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from models import db, User, Product, QualityInspection, RetailSale
+
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+# Encoded bytes gathered before a chunk is compressed and handed to the client
+FLUSH_BYTES = 64 * 1024
+
+
+class ExportError(Exception):
+    pass
+
+
+# entity -> (model, owner column, timestamp column or None, exported columns)
+ENTITIES = {
+    'products': (Product, Product.farmer_id, None, (
+        Product.id, Product.name, Product.description, Product.quantity, Product.quality,
+        Product.fertilizer, Product.organic, Product.soil, Product.irrigation,
+        Product.farmer_id, User.username.label('farmer'), Product.assigned_transporter_id, Product.tx_hash,
+    )),
+    'inspections': (QualityInspection, QualityInspection.inspector_id, QualityInspection.timestamp, (
+        QualityInspection.id, QualityInspection.product_id, QualityInspection.inspector_id,
+        User.username.label('inspector'), QualityInspection.grade, QualityInspection.certificate,
+        QualityInspection.ml_score, QualityInspection.comments, QualityInspection.tx_hash, QualityInspection.timestamp,
+    )),
+    # qr_img (legacy inline PNGs) is left out; qr_hash names the image in the QR store
+    'sales': (RetailSale, RetailSale.retailer_id, RetailSale.timestamp, (
+        RetailSale.id, RetailSale.product_id, RetailSale.retailer_id, User.username.label('retailer'),
+        RetailSale.sale_price, RetailSale.retail_details, RetailSale.qr_data, RetailSale.qr_hash,
+        RetailSale.tx_hash, RetailSale.timestamp,
+    )),
+}
+
+
+def parse_date(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"{name} must be an ISO date or datetime")
+
+
+def export_query(entity, owner_id=None, since=None, until=None):
+    """SELECT for one entity; owner_id is the farmer, inspector or retailer, since/until bound the timestamp."""
+    if entity not in ENTITIES:
+        raise ExportError(f"unknown entity {entity!r}; expected one of {', '.join(ENTITIES)}")
+    model, owner, stamp, columns = ENTITIES[entity]
+    query = select(*columns).select_from(model).join(User, User.id == owner)
+    if owner_id is not None:
+        query = query.where(owner == owner_id)
+    if since or until:
+        if stamp is None:
+            raise ExportError(f"{entity} have no timestamp to filter on")
+        if since:
+            query = query.where(stamp >= since)
+        if until:
+            query = query.where(stamp < until)
+    return query.order_by(model.id)
+
+
+def iter_rows(query, chunk_size=1000):
+    """Stream result rows a chunk at a time.
+
+    stream_results asks the driver for a server-side cursor (psycopg2) or lazy
+    fetching (sqlite3), and yield_per keeps only chunk_size rows buffered, so
+    memory stays flat however many rows match.
+    """
+    result = db.session.execute(query, execution_options={'stream_results': True, 'yield_per': chunk_size})
+    try:
+        yield list(result.keys())
+        for partition in result.partitions():
+            yield from partition
+    finally:
+        result.close()
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode(rows, fmt):
+    """Turn iter_rows output into CSV or NDJSON text chunks of roughly FLUSH_BYTES."""
+    rows = iter(rows)
+    fields = next(rows)
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        write = lambda row: writer.writerow([_value(v) for v in row])
+    else:
+        write = lambda row: buffer.write(json.dumps(dict(zip(fields, map(_value, row))), separators=(',', ':')) + '\n')
+    for row in rows:
+        write(row)
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def compress(chunks, level=6):
+    """Gzip a stream of text chunks incrementally (one compressor, no buffering of the whole body)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(entity, fmt='csv', gzip=True, owner_id=None, since=None, until=None, chunk_size=1000):
+    """Bytes of a full export, produced lazily; errors in the arguments raise before the first chunk."""
+    query = export_query(entity, owner_id, since, until)
+    if fmt not in FORMATS:
+        raise ExportError(f"unknown format {fmt!r}; expected csv or ndjson")
+    chunks = encode(iter_rows(query, chunk_size), fmt)
+    if gzip:
+        return compress(chunks)
+    return (chunk.encode('utf-8') for chunk in chunks)
+
+
+def filename(entity, fmt, gzip):
+    return f"{entity}.{fmt}" + ('.gz' if gzip else '')
@@ -1,6 +1,8 @@
 
 from models import db, User
-from app import app
+from app import create_app
+
+app = create_app()
 
 with app.app_context():
     # Find or create inspector user
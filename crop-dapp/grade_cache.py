@@ -0,0 +1,165 @@
+import json
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from ml_quality_model import MODEL_VERSION, grade_crop, grade_crops
+from models import db, Product, MLGradeCache
+from sql_utils import upsert
+
+# Product columns the ML grade depends on, in grade_crop argument order
+FEATURE_COLUMNS = ('fertilizer', 'organic', 'soil', 'irrigation', 'quantity', 'quality')
+NO_GRADE = (0, 'N/A', 'N/A')
+
+
+class GradeCache:
+    """LRU cache of ML grades keyed on the product feature tuple.
+
+    Grading is a pure function of the features, so keying on them is what keeps the
+    cache correct: when a Product's feature columns change (an edit, fix_products.py
+    running in another process) its next lookup resolves to a different key, and the
+    old entry simply ages out of the LRU. Persisted grades are additionally scoped by
+    MODEL_VERSION so a change to the weights invalidates the whole table.
+    """
+
+    def __init__(self, maxsize=4096, persist=False):
+        self.maxsize = maxsize
+        self.persist = persist
+        self._grades = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.persisted_hits = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('GRADE_CACHE_SIZE', self.maxsize)
+        self.persist = app.config.get('GRADE_CACHE_PERSIST', self.persist)
+
+    # ---------- lookups ----------
+    def grade_product(self, product_id):
+        """Grade a product by id; only its feature columns are read, the grader runs on a miss."""
+        row = db.session.query(*(getattr(Product, col) for col in FEATURE_COLUMNS)).filter(Product.id == product_id).first()
+        if row is None:
+            return NO_GRADE
+        return self.grade_features(tuple(row))
+
+    def grade_features(self, features):
+        features = tuple(features)
+        if any(v is None for v in features):
+            return NO_GRADE
+        cached = self._lookup(features)
+        if cached is not None:
+            return cached
+        result = self._load_persisted([features]).get(features)
+        if result is None:
+            result = grade_crop(*features)
+            self._persist({features: result})
+        self._remember(features, result)
+        return result
+
+    def grade_many(self, rows):
+        """Grade a sequence of feature tuples, running all misses through one batch pass."""
+        rows = [tuple(r) for r in rows]
+        results = [None] * len(rows)
+        missing = {}
+        for i, features in enumerate(rows):
+            if any(v is None for v in features):
+                results[i] = NO_GRADE
+                continue
+            cached = self._lookup(features)
+            if cached is not None:
+                results[i] = cached
+            else:
+                missing.setdefault(features, []).append(i)
+        if missing:
+            found = self._load_persisted(list(missing))
+            to_grade = [f for f in missing if f not in found]
+            graded = dict(zip(to_grade, grade_crops(to_grade)))
+            self._persist(graded)
+            found.update(graded)
+            for features, result in found.items():
+                self._remember(features, result)
+                for i in missing[features]:
+                    results[i] = result
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._grades.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'persisted_hits': self.persisted_hits,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'grades_cached': len(self._grades),
+                'maxsize': self.maxsize,
+                'persist': self.persist,
+                'model_version': MODEL_VERSION,
+            }
+
+    # ---------- internals ----------
+    def _lookup(self, features):
+        with self._lock:
+            result = self._grades.get(features)
+            if result is None:
+                self.misses += 1
+                return None
+            self._grades.move_to_end(features)
+            self.hits += 1
+            return result
+
+    def _remember(self, features, result):
+        with self._lock:
+            self._grades[features] = result
+            self._grades.move_to_end(features)
+            while len(self._grades) > self.maxsize:
+                self._grades.popitem(last=False)
+
+    def _load_persisted(self, features_list):
+        if not self.persist or not features_list:
+            return {}
+        keys = {json.dumps(f): f for f in features_list}
+        rows = MLGradeCache.query.filter(
+            MLGradeCache.model_version == MODEL_VERSION,
+            MLGradeCache.key.in_(list(keys))
+        ).all()
+        with self._lock:
+            self.persisted_hits += len(rows)
+        return {keys[r.key]: (r.score, r.grade, r.certification) for r in rows}
+
+    def _persist(self, graded):
+        if not self.persist or not graded:
+            return
+        # Written once the caller's transaction ends: a separate connection cannot
+        # write while that transaction holds SQLite's write lock
+        pending = db.session.info.setdefault('grade_cache_pending', {})
+        pending.update(graded)
+
+    def write_persisted(self, graded):
+        rows = [
+            {'key': json.dumps(f), 'model_version': MODEL_VERSION, 'score': score, 'grade': grade, 'certification': cert}
+            for f, (score, grade, cert) in graded.items()
+        ]
+        try:
+            with db.engine.begin() as conn:
+                upsert(conn, MLGradeCache.__table__, rows, ['key', 'model_version'], update_columns=[])
+        except SQLAlchemyError:
+            pass  # the grades are still in memory; persisting them is best effort
+
+
+grade_cache = GradeCache()
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _write_pending_grades(session, transaction):
+    if transaction.parent is None:
+        pending = session.info.pop('grade_cache_pending', None)
+        if pending:
+            grade_cache.write_persisted(pending)
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import g, session
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db, User
+
+# Read-only snapshot of the logged-in user, safe to share across requests and threads
+Identity = namedtuple('Identity', 'id username role wallet_address')
+
+
+class IdentityCache:
+    """Who is logged in, resolved at most once per request.
+
+    The identity is memoized on flask.g for the request and kept in a small TTL
+    cache across requests, so a dashboard render usually issues no user query
+    at all. Deactivated users resolve to None. Entries are dropped after any
+    commit that updates or deletes the user (role, wallet or password change,
+    deactivation, deletion); the TTL bounds staleness for changes made by other
+    processes.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('IDENTITY_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('IDENTITY_CACHE_TTL', self.ttl)
+
+    def current(self):
+        if 'identity' not in g:
+            user_id = session.get('user_id')
+            g.identity = self.get(user_id) if user_id is not None else None
+        return g.identity
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        row = db.session.query(User.id, User.username, User.role, User.wallet_address).filter(
+            User.id == user_id, User.active.isnot(False)
+        ).first()
+        identity = Identity(*row) if row else None
+        if identity is not None:
+            with self._lock:
+                self._entries[user_id] = (now + self.ttl, identity)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+        if g:  # also callable outside a request, e.g. from CLI scripts
+            g.pop('identity', None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'ttl': self.ttl}
+
+
+identity_cache = IdentityCache()
+
+
+def _mark_dirty(mapper, connection, target):
+    Session.object_session(target).info.setdefault('identity_dirty', set()).add(target.id)
+
+
+event.listen(User, 'after_update', _mark_dirty)
+event.listen(User, 'after_delete', _mark_dirty)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    dirty = session.info.pop('identity_dirty', None)
+    if dirty:
+        identity_cache.invalidate(dirty)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('identity_dirty', None)
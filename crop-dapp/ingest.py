@@ -0,0 +1,120 @@
+import json
+from itertools import islice
+
+from analytics import apply_products
+from grade_cache import FEATURE_COLUMNS, grade_cache
+from models import db, Product
+
+# Optional text columns accepted by /record_products, with their max lengths
+TEXT_FIELDS = {
+    'description': None,
+    'quality': 80,
+    'fertilizer': 120,
+    'organic': 20,
+    'soil': 80,
+    'irrigation': 80,
+}
+
+
+class IngestError(Exception):
+    pass
+
+
+def iter_records(req):
+    """Yield decoded records from a JSON array body or an NDJSON stream.
+
+    NDJSON is read line by line from the request stream, so the body is never held
+    in memory as a whole; a line that is not valid JSON is yielded as an error
+    string and reported against its row.
+    """
+    if req.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        for line in req.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield f"invalid JSON: {e}"
+        return
+    data = req.get_json(silent=True)
+    if not isinstance(data, list):
+        raise IngestError("body must be a JSON array or an application/x-ndjson stream")
+    yield from data
+
+
+def validate_record(record, farmer_id):
+    """Return (row, None) for a valid record or (None, error message)."""
+    if isinstance(record, str):
+        return None, record
+    if not isinstance(record, dict):
+        return None, "record must be an object"
+    name = record.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return None, "missing fields: name"
+    if len(name) > 120:
+        return None, "name too long"
+    qty = record.get('quantity')
+    if qty is None:
+        return None, "missing fields: quantity"
+    try:
+        qty = int(qty)
+    except (TypeError, ValueError):
+        return None, "quantity must be an integer"
+    if qty < 0:
+        return None, "quantity must not be negative"
+    tx_hash = record.get('txHash')
+    if tx_hash is not None and not isinstance(tx_hash, str):
+        return None, "txHash must be a string"
+    if tx_hash is not None and len(tx_hash) > 200:
+        return None, "txHash too long"
+    row = {'name': name, 'quantity': qty, 'farmer_id': farmer_id, 'tx_hash': tx_hash}
+    for field, max_len in TEXT_FIELDS.items():
+        value = record.get(field)
+        if value is not None and not isinstance(value, str):
+            return None, f"{field} must be a string"
+        if value is not None and max_len and len(value) > max_len:
+            return None, f"{field} too long"
+        row[field] = value
+    return row, None
+
+
+def ingest_products(records, farmer_id, chunk_size=500, max_rows=None):
+    """Validate and insert records in chunks inside the caller's transaction.
+
+    Each chunk of valid rows is one multi-row INSERT ... RETURNING id and is graded
+    in one batch as it goes in. Returns one result dict per input record, in order.
+    The caller commits (or rolls back) once at the end.
+    """
+    results = []
+    records = iter(records)
+    index = 0
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        if max_rows is not None and index + len(chunk) > max_rows:
+            raise IngestError(f"at most {max_rows} products per request")
+        valid_rows, valid_results = [], []
+        for record in chunk:
+            row, error = validate_record(record, farmer_id)
+            result = {'row': index}
+            if error:
+                result['error'] = error
+            else:
+                valid_rows.append(row)
+                valid_results.append(result)
+            results.append(result)
+            index += 1
+        if not valid_rows:
+            continue
+        ids = db.session.execute(
+            db.insert(Product).returning(Product.id, sort_by_parameter_order=True),
+            valid_rows
+        ).scalars().all()
+        # Core inserts skip the ORM events that keep the rollups current
+        apply_products(db.session.connection(), Product.id.in_(ids))
+        grades = grade_cache.grade_many([tuple(row[col] for col in FEATURE_COLUMNS) for row in valid_rows])
+        for result, product_id, (score, grade, certification) in zip(valid_results, ids, grades):
+            result.update(product_id=product_id, score=score, grade=grade, certification=certification)
+    return results
@@ -0,0 +1,305 @@
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from flask import Response, abort, before_render_template, g, has_request_context, request, session, template_rendered
+from sqlalchemy import event
+
+from models import db
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (512, 2048, 8192, 32768, 131072, 524288, 2097152, 8388608)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 500, 1000)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class CounterMetric:
+    """Prometheus counter with labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f'{self.name}{_labels(self.labelnames, labels)} {value}'
+
+
+class HistogramMetric:
+    """Prometheus histogram with labels and fixed upper bounds."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((labels, (list(b), s, c)) for labels, (b, s, c) in self._values.items())
+        for labels, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, bucket_counts):
+                cumulative += n
+                yield f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", bound)])} {cumulative}'
+            yield f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", "+Inf")])} {count}'
+            yield f'{self.name}_sum{_labels(self.labelnames, labels)} {total}'
+            yield f'{self.name}_count{_labels(self.labelnames, labels)} {count}'
+
+
+class SamplingProfiler:
+    """Wall-clock sampler of the threads currently serving requests.
+
+    Every interval it grabs the stacks of in-request threads from
+    sys._current_frames() and counts them in collapsed-stack form
+    ("frame;frame;frame count"), which flamegraph.pl and speedscope read directly.
+    Sampling costs nothing while stopped and can be started and stopped at runtime.
+    """
+
+    def __init__(self, active_threads, max_stacks=20000):
+        # callable returning the ids of threads currently serving a request
+        self.active_threads = active_threads
+        self.max_stacks = max_stacks
+        self.stacks = Counter()
+        self.samples = 0
+        self.interval = 0.005
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None, duration=None):
+        with self._lock:
+            if self.running:
+                return False
+            self.interval = interval or self.interval
+            self.stacks.clear()
+            self.samples = 0
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(duration,), name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self, duration):
+        deadline = time.monotonic() + duration if duration else None
+        while not self._stop.wait(self.interval):
+            if deadline and time.monotonic() > deadline:
+                break
+            frames = sys._current_frames()
+            for thread_id in self.active_threads():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]}:{frame.f_lineno})')
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                with self._lock:
+                    if key in self.stacks or len(self.stacks) < self.max_stacks:
+                        self.stacks[key] += 1
+                    self.samples += 1
+
+    def collapsed(self):
+        with self._lock:
+            return '\n'.join(f'{stack} {n}' for stack, n in self.stacks.most_common()) + '\n'
+
+
+class Instrumentation:
+    """Opt-in request, SQL and template metrics, exported at /metrics.
+
+    Enabled with INSTRUMENTATION=1. Each request records its latency, response
+    size, SQL statement count and time, and the render time of every template;
+    a statement text executed N_PLUS_ONE_THRESHOLD or more times within one
+    request is counted (and logged once) as a likely N+1. Everything is kept
+    in-process and rendered in the Prometheus text format, so a scraper or a
+    plain curl is all that is needed. /debug/profiler starts and stops a
+    sampling profiler of request threads (admin session or metrics token).
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.token = None
+        self.n_plus_one_threshold = 10
+        self._active = set()
+        self._active_lock = threading.Lock()
+        self._reported = set()
+        self.profiler = SamplingProfiler(self._active_threads)
+        self.request_seconds = HistogramMetric('crop_http_request_duration_seconds', 'Request latency', ('route', 'method', 'status'))
+        self.response_bytes = HistogramMetric('crop_http_response_size_bytes', 'Response body size', ('route',), SIZE_BUCKETS)
+        self.sql_per_request = HistogramMetric('crop_sql_statements_per_request', 'SQL statements per request', ('route',), COUNT_BUCKETS)
+        self.sql_seconds = HistogramMetric('crop_sql_statement_duration_seconds', 'SQL statement latency', ('route',))
+        self.template_seconds = HistogramMetric('crop_template_render_seconds', 'Template render time', ('template',))
+        self.n_plus_one = CounterMetric('crop_sql_n_plus_one_total', 'Requests that repeated one statement at least the N+1 threshold', ('route',))
+        self.metrics = (self.request_seconds, self.response_bytes, self.sql_per_request, self.sql_seconds,
+                        self.template_seconds, self.n_plus_one)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('INSTRUMENTATION', False)
+        if not self.enabled:
+            return
+        self.token = app.config.get('METRICS_TOKEN')
+        self.n_plus_one_threshold = app.config.get('N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        self.profiler.interval = app.config.get('PROFILER_INTERVAL_MS', 5) / 1000
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        app.add_url_rule('/debug/profiler', 'profiler', self.profiler_view, methods=['GET', 'POST'])
+
+    # ---------- request hooks ----------
+    @staticmethod
+    def _route():
+        return request.url_rule.rule if request.url_rule else '<unmatched>'
+
+    def _before_request(self):
+        g.instr_started = time.perf_counter()
+        g.instr_statements = Counter()
+        g.instr_sql_count = 0
+        with self._active_lock:
+            self._active.add(threading.get_ident())
+
+    def _after_request(self, response):
+        started = g.get('instr_started')
+        if started is None:
+            return response
+        route = self._route()
+        self.request_seconds.observe(time.perf_counter() - started, route, request.method, response.status_code)
+        if not response.is_streamed:
+            self.response_bytes.observe(response.calculate_content_length() or 0, route)
+        self.sql_per_request.observe(g.instr_sql_count, route)
+        if g.instr_statements:
+            statement, repeats = g.instr_statements.most_common(1)[0]
+            if repeats >= self.n_plus_one_threshold:
+                self.n_plus_one.inc(route)
+                if (route, statement) not in self._reported:
+                    self._reported.add((route, statement))
+                    log.warning("possible N+1 on %s: statement ran %d times in one request: %s", route, repeats, statement[:300])
+        return response
+
+    def _teardown_request(self, exc):
+        with self._active_lock:
+            self._active.discard(threading.get_ident())
+
+    def _active_threads(self):
+        with self._active_lock:
+            return list(self._active)
+
+    # ---------- SQL ----------
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('instr_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['instr_started'].pop()
+        if has_request_context() and 'instr_statements' in g:
+            g.instr_sql_count += 1
+            g.instr_statements[statement] += 1
+            self.sql_seconds.observe(elapsed, self._route())
+        else:
+            self.sql_seconds.observe(elapsed, '<background>')
+
+    # ---------- templates ----------
+    def _before_render(self, sender, template, context, **extra):
+        g.setdefault('instr_templates', []).append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        stack = g.get('instr_templates')
+        if stack:
+            self.template_seconds.observe(time.perf_counter() - stack.pop(), template.name or '<string>')
+
+    # ---------- endpoints ----------
+    def _authorized(self):
+        if self.token and request.headers.get('Authorization') == f'Bearer {self.token}':
+            return True
+        return session.get('role') == 'admin'
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        lines.append('# HELP crop_profiler_running Whether the sampling profiler is running')
+        lines.append('# TYPE crop_profiler_running gauge')
+        lines.append(f'crop_profiler_running {int(self.profiler.running)}')
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        if not self._authorized():
+            abort(403)
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def profiler_view(self):
+        """GET: collapsed stacks so far. POST action=start|stop (start takes interval_ms and seconds)."""
+        if not self._authorized():
+            abort(403)
+        if request.method == 'POST':
+            action = request.values.get('action')
+            if action == 'start':
+                interval_ms = request.values.get('interval_ms', type=float)
+                started = self.profiler.start(interval_ms / 1000 if interval_ms else None, request.values.get('seconds', type=float))
+                return {'running': True, 'started': started, 'interval_ms': self.profiler.interval * 1000}
+            if action == 'stop':
+                self.profiler.stop()
+                return {'running': False, 'samples': self.profiler.samples}
+            abort(400)
+        return Response(self.profiler.collapsed(), mimetype='text/plain')
+
+
+instrumentation = Instrumentation()
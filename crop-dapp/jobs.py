@@ -0,0 +1,224 @@
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event, or_, update
+from sqlalchemy.orm import Session
+
+from models import db, Job
+
+LIVE = ('queued', 'running')
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """Local background job runner backed by the job table.
+
+    Jobs are written in the caller's transaction and only handed to the worker
+    pool once that transaction commits, so a job never runs for a row that was
+    rolled back. Failed jobs are retried with exponential backoff up to
+    max_attempts. At most max_pending jobs may be in flight at once.
+
+    Each job is leased to one process (owner, lease_until): the one that
+    enqueued it, or the one that adopted it after its owner died. A heartbeat
+    thread renews the leases of every job the process holds, and a job only
+    starts while its owner still holds it. resume() adopts queued or running
+    jobs whose lease has expired and keeps doing so on every heartbeat, so a
+    new process never re-runs the live jobs of a sibling, and the jobs of a
+    crashed one are taken over a lease period later. Only kinds with a
+    registered handler are adopted.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.handlers = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self.owner = None
+        self._heartbeat = None
+        self._adopting = False
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('JOB_WORKERS', 2)
+        self.max_pending = app.config.get('JOB_MAX_PENDING', 200)
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', 3)
+        self.retry_backoff = app.config.get('JOB_RETRY_BACKOFF', 2.0)
+        self.lease = app.config.get('JOB_LEASE_SECONDS', 60)
+        self.owner = f"{socket.gethostname()[:60]}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+
+    def handler(self, kind):
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    # ---------- producer side ----------
+    def full(self):
+        with self._lock:
+            return len(self._in_flight) >= self.max_pending
+
+    def enqueue(self, kind, payload, max_attempts=None):
+        """Add a job to the current session; it is dispatched after the session commits."""
+        if kind not in self.handlers:
+            raise ValueError(f"no handler registered for job kind {kind!r}")
+        if self.full():
+            raise JobQueueFull(f"{self.max_pending} jobs already pending")
+        job = Job(kind=kind, payload=json.dumps(payload), status='queued', attempts=0,
+                  max_attempts=max_attempts or self.max_attempts, owner=self.owner, lease_until=time.time() + self.lease)
+        db.session.add(job)
+        db.session.flush()
+        db.session.info.setdefault('pending_jobs', []).append(job.id)
+        return job
+
+    def resume(self):
+        """Adopt jobs whose owning process died, now and on every later heartbeat.
+
+        Returns the number adopted now. A process that exited moments ago still
+        holds its leases; its jobs are adopted once those run out.
+        """
+        self._adopting = True
+        self._start_heartbeat()
+        return self._adopt_expired()
+
+    def _adopt_expired(self):
+        now = time.time()
+        expired = or_(Job.lease_until.is_(None), Job.lease_until < now)
+        with self._lock:
+            room = self.max_pending - len(self._in_flight)
+        rows = db.session.query(Job.id, Job.next_attempt_at).filter(
+            Job.status.in_(LIVE), Job.kind.in_(list(self.handlers)), expired
+        ).order_by(Job.id).limit(max(room, 0)).all()
+        adopted = 0
+        for job_id, next_attempt_at in rows:
+            # Conditional on the lease still being expired, so one process wins each job
+            taken = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status.in_(LIVE), expired)
+                .values(owner=self.owner, lease_until=now + self.lease)
+            ).rowcount
+            db.session.commit()
+            if taken:
+                adopted += 1
+                self._dispatch(job_id, delay=(next_attempt_at - now) if next_attempt_at else 0)
+        return adopted
+
+    def _dispatch(self, job_id, delay=0):
+        self._start_heartbeat()
+        with self._lock:
+            self._in_flight.add(job_id)
+        if delay > 0:
+            timer = threading.Timer(delay, self._executor.submit, (self._run, job_id))
+            timer.daemon = True
+            timer.start()
+        else:
+            self._executor.submit(self._run, job_id)
+
+    # ---------- worker side ----------
+    def _run(self, job_id):
+        retry_in = None
+        with self.app.app_context():
+            try:
+                # Start only while this process still holds the lease
+                started = db.session.execute(
+                    update(Job).where(Job.id == job_id, Job.owner == self.owner, Job.status.in_(LIVE)).values(
+                        status='running', attempts=Job.attempts + 1, next_attempt_at=None,
+                        lease_until=time.time() + self.lease)
+                ).rowcount
+                db.session.commit()
+                if not started:
+                    return
+                job = db.session.get(Job, job_id)
+                try:
+                    result = self.handlers[job.kind](json.loads(job.payload))
+                except Exception:
+                    db.session.rollback()
+                    job.last_error = traceback.format_exc(limit=5)
+                    if job.attempts < job.max_attempts:
+                        retry_in = self.retry_backoff * 2 ** (job.attempts - 1)
+                        job.status = 'queued'
+                        job.next_attempt_at = time.time() + retry_in
+                    else:
+                        job.status = 'failed'
+                        job.lease_until = None
+                else:
+                    job.status = 'done'
+                    job.result = json.dumps(result)
+                    job.last_error = None
+                    job.lease_until = None
+                db.session.commit()
+            finally:
+                db.session.remove()
+                if retry_in is None:
+                    with self._lock:
+                        self._in_flight.discard(job_id)
+        if retry_in is not None:
+            self._dispatch(job_id, delay=retry_in)
+
+    # ---------- leases ----------
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+                self._heartbeat.start()
+
+    def _beat(self):
+        while True:
+            time.sleep(self.lease / 3)
+            with self.app.app_context():
+                try:
+                    with self._lock:
+                        held = list(self._in_flight)
+                    if held:
+                        db.session.execute(
+                            update(Job).where(Job.id.in_(held), Job.owner == self.owner, Job.status.in_(LIVE))
+                            .values(lease_until=time.time() + self.lease)
+                        )
+                        db.session.commit()
+                    if self._adopting and not self.full():
+                        self._adopt_expired()
+                except Exception:
+                    # A busy database costs one beat; a lease outlasts three
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._in_flight), 'max_pending': self.max_pending, 'workers': self.workers,
+                    'owner': self.owner}
+
+
+job_queue = JobQueue()
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_committed_jobs(session):
+    for job_id in session.info.pop('pending_jobs', ()):
+        job_queue._dispatch(job_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back_jobs(session):
+    session.info.pop('pending_jobs', None)
+
+
+def job_status(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.last_error.strip().splitlines()[-1] if job.last_error else None,
+    }
@@ -0,0 +1,84 @@
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import aliased
+
+from models import db, User, Product
+
+# Transporter names offered by the typeahead per keystroke
+SUGGEST_LIMIT = 10
+
+
+def _contains(column, q):
+    escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.ilike(f'%{escaped}%', escape='\\')
+
+
+def _page(rows, limit, key):
+    """Split a limit+1 fetch into (items, next_after): next_after is None on the last page."""
+    items = rows[:limit]
+    next_after = key(items[-1]) if len(rows) > limit else None
+    return items, next_after
+
+
+def list_users(q=None, role=None, after_id=0, limit=50):
+    """Non-admin users, filtered by username substring and role, keyed on id."""
+    query = db.session.query(User.id, User.username, User.role, User.wallet_address, User.active).filter(
+        User.role != 'admin', User.id > after_id
+    )
+    if role:
+        query = query.filter(User.role == role)
+    if q:
+        query = query.filter(_contains(User.username, q))
+    rows = query.order_by(User.id).limit(limit + 1).all()
+    items, next_after = _page(rows, limit, lambda r: r.id)
+    return [r._asdict() for r in items], next_after
+
+
+def list_transporters(q=None, after_id=0, limit=50):
+    """Transporters with the number of products currently assigned to each."""
+    assigned = select(func.count(Product.id)).where(Product.assigned_transporter_id == User.id).correlate(User).scalar_subquery()
+    query = db.session.query(User.id, User.username, User.wallet_address, assigned.label('assigned_products')).filter(
+        User.role == 'transporter', User.id > after_id
+    )
+    if q:
+        query = query.filter(_contains(User.username, q))
+    rows = query.order_by(User.id).limit(limit + 1).all()
+    items, next_after = _page(rows, limit, lambda r: r.id)
+    return [r._asdict() for r in items], next_after
+
+
+def suggest_transporters(prefix, limit=SUGGEST_LIMIT):
+    """Active transporters whose username starts with prefix, as a range scan on the username index."""
+    if not prefix:
+        return []
+    rows = db.session.query(User.id, User.username).filter(
+        User.username >= prefix, User.username < prefix + '\uffff', User.role == 'transporter', User.active.isnot(False)
+    ).order_by(User.username).limit(limit).all()
+    return [r._asdict() for r in rows]
+
+
+def list_products(q=None, farmer_id=None, transporter_id=None, assigned=None, after_id=0, limit=50):
+    """Products with farmer and transporter names, one query per page.
+
+    q matches the product id exactly or a substring of the name; assigned=True/False
+    keeps only products with/without a transporter.
+    """
+    farmer = aliased(User)
+    transporter = aliased(User)
+    query = db.session.query(
+        Product.id, Product.name, Product.quantity, Product.quality, Product.farmer_id,
+        farmer.username.label('farmer'), Product.assigned_transporter_id, transporter.username.label('transporter')
+    ).join(farmer, farmer.id == Product.farmer_id).outerjoin(
+        transporter, transporter.id == Product.assigned_transporter_id
+    ).filter(Product.id > after_id)
+    if q:
+        match = _contains(Product.name, q)
+        query = query.filter(or_(Product.id == int(q), match) if q.isdigit() else match)
+    if farmer_id is not None:
+        query = query.filter(Product.farmer_id == farmer_id)
+    if transporter_id is not None:
+        query = query.filter(Product.assigned_transporter_id == transporter_id)
+    if assigned is not None:
+        query = query.filter(Product.assigned_transporter_id.isnot(None) if assigned else Product.assigned_transporter_id.is_(None))
+    rows = query.order_by(Product.id).limit(limit + 1).all()
+    items, next_after = _page(rows, limit, lambda r: r.id)
+    return [r._asdict() for r in items], next_after
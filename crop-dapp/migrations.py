@@ -0,0 +1,106 @@
+import base64
+
+from sqlalchemy import inspect, text
+
+from analytics import ROLLUPS, rebuild as rebuild_analytics
+from models import db, User, RetailSale
+from qr_store import qr_store, qr_hash
+from search import install_fts
+
+# Rows moved per transaction by the data migrations below
+MIGRATION_CHUNK_SIZE = 500
+
+
+def upgrade_schema():
+    """Bring an existing database up to the current models.
+
+    db.create_all only creates missing tables, so columns and indexes added to
+    existing models are applied here. New columns must be nullable (SQLite can
+    only ADD COLUMN without a table rebuild). On SQLite the product search
+    index and its triggers are created (and filled) here too, and newly
+    created analytics rollups are built from the existing rows.
+    """
+    engine = db.engine
+    new_tables = set(db.metadata.tables) - set(inspect(engine).get_table_names())
+    db.create_all()
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {c['name'] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {col_type}'))
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        install_fts(conn)
+    if new_tables & {model.__tablename__ for model in ROLLUPS}:
+        # Fresh rollup tables start empty; fill them from whatever history exists
+        rebuild_analytics()
+
+
+def seed_default_users():
+    """Default admin/inspector accounts and the single shared retailer account."""
+    if not User.query.filter_by(username='admin').first():
+        admin = User(username="admin", role="admin")
+        admin.set_password("admin123")
+        db.session.add(admin)
+        db.session.commit()
+    # Create default inspector
+    if not User.query.filter_by(username='inspector').first():
+        inspector = User(username="inspector", role="inspector")
+        inspector.set_password("inspector123")
+        db.session.add(inspector)
+        db.session.commit()
+    # Remove all retailers except 'retailer', and reset password
+    retailers = User.query.filter_by(role='retailer').all()
+    for r in retailers:
+        if r.username != 'retailer':
+            db.session.delete(r)
+    db.session.commit()
+    retailer = User.query.filter_by(username='retailer').first()
+    if not retailer:
+        retailer = User(username="retailer", role="retailer")
+        retailer.set_password("retailer123")
+        db.session.add(retailer)
+    else:
+        retailer.set_password("retailer123")
+    db.session.commit()
+
+
+def migrate_qr_images(chunk_size=MIGRATION_CHUNK_SIZE, vacuum=True):
+    """Move inline base64 QR images out of retail_sale into the QR store."""
+    moved = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(RetailSale.id, RetailSale.qr_data, RetailSale.qr_img).filter(
+            RetailSale.id > last_id,
+            RetailSale.qr_img.isnot(None)
+        ).order_by(RetailSale.id).limit(chunk_size).all()
+        if not rows:
+            break
+        updates = []
+        for sale_id, qr_data, qr_img in rows:
+            png = base64.b64decode(qr_img)
+            digest = qr_hash(qr_data) if qr_data else qr_hash(qr_img)
+            qr_store.put_png(digest, png)
+            updates.append({'id': sale_id, 'qr_hash': digest, 'qr_img': None})
+        db.session.execute(db.update(RetailSale), updates)
+        db.session.commit()
+        moved += len(rows)
+        last_id = rows[-1][0]
+    if vacuum and moved and db.engine.dialect.name == 'sqlite':
+        # Reclaim the pages the base64 payloads occupied
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('VACUUM'))
+    return moved
+
+
+if __name__ == '__main__':
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        upgrade_schema()
+        print(f"Moved {migrate_qr_images()} QR images into {qr_store.root}")
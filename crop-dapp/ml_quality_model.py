@@ -1,44 +1,68 @@
 import numpy as np
 
+# Bump whenever the weights or grade bands change so persisted grades are not reused
+MODEL_VERSION = 1
+
+# Weighted categorical encodings, built once at import time
+FERTILIZER_WEIGHTS = {
+    'urea': 0.05,
+    'compost': 0.18,
+    'vermicompost': 0.20,
+    'biofertilizer': 0.22,
+    'npk': 0.10,
+    'dap': 0.08
+}
+SOIL_WEIGHTS = {
+    'loamy': 0.18,
+    'sandy': 0.08,
+    'sandy loam': 0.15,
+    'clay': 0.10,
+    'silt': 0.12
+}
+IRRIGATION_WEIGHTS = {
+    'drip': 0.15,
+    'sprinkler': 0.12,
+    'flood': 0.05,
+    'manual': 0.03
+}
+QUALITY_WEIGHTS = {
+    'premium': 0.18,
+    'high': 0.14,
+    'medium': 0.08,
+    'low': 0.03
+}
+# Fallback weight for values not in the table above
+FERTILIZER_DEFAULT = 0.05
+SOIL_DEFAULT = 0.08
+IRRIGATION_DEFAULT = 0.03
+QUALITY_DEFAULT = 0.03
+ORGANIC_WEIGHT = 0.25
+NON_ORGANIC_WEIGHT = 0.10
+INTERACTION_FERTILIZERS = ('compost', 'vermicompost', 'biofertilizer')
+INTERACTION_BONUS = 0.08
+
+# Grade bands, highest first: (min score, grade, certification)
+GRADE_BANDS = (
+    (0.85, 'A+', 'Organic Premium Plus'),
+    (0.7, 'A', 'Organic Premium'),
+    (0.55, 'B', 'Certified Good'),
+    (0.4, 'C', 'Standard'),
+)
+LOWEST_GRADE = ('D', 'Needs Improvement')
+
+
 def grade_crop(fertilizer, organic, soil, irrigation, quantity, quality):
     # Advanced scoring logic: weighted categorical encoding and feature interactions
-    fertilizer_weights = {
-        'urea': 0.05,
-        'compost': 0.18,
-        'vermicompost': 0.20,
-        'biofertilizer': 0.22,
-        'npk': 0.10,
-        'dap': 0.08
-    }
-    organic_weight = 0.25 if organic.lower() == 'organic' else 0.10
-    soil_weights = {
-        'loamy': 0.18,
-        'sandy': 0.08,
-        'sandy loam': 0.15,
-        'clay': 0.10,
-        'silt': 0.12
-    }
-    irrigation_weights = {
-        'drip': 0.15,
-        'sprinkler': 0.12,
-        'flood': 0.05,
-        'manual': 0.03
-    }
-    quality_weights = {
-        'premium': 0.18,
-        'high': 0.14,
-        'medium': 0.08,
-        'low': 0.03
-    }
+    organic_weight = ORGANIC_WEIGHT if organic.lower() == 'organic' else NON_ORGANIC_WEIGHT
     # Feature interaction: organic + compost/vermicompost/biofertilizer
-    interaction_bonus = 0.08 if organic.lower() == 'organic' and fertilizer.lower() in ['compost', 'vermicompost', 'biofertilizer'] else 0
+    interaction_bonus = INTERACTION_BONUS if organic.lower() == 'organic' and fertilizer.lower() in INTERACTION_FERTILIZERS else 0
 
     score = 0.0
-    score += fertilizer_weights.get(fertilizer.lower(), 0.05)
+    score += FERTILIZER_WEIGHTS.get(fertilizer.lower(), FERTILIZER_DEFAULT)
     score += organic_weight
-    score += soil_weights.get(soil.lower(), 0.08)
-    score += irrigation_weights.get(irrigation.lower(), 0.03)
-    score += quality_weights.get(quality.lower(), 0.03)
+    score += SOIL_WEIGHTS.get(soil.lower(), SOIL_DEFAULT)
+    score += IRRIGATION_WEIGHTS.get(irrigation.lower(), IRRIGATION_DEFAULT)
+    score += QUALITY_WEIGHTS.get(quality.lower(), QUALITY_DEFAULT)
     score += min(0.12, max(0, float(quantity)/500))  # up to 0.12 for large quantity
     score += interaction_bonus
 
@@ -46,19 +70,77 @@ def grade_crop(fertilizer, organic, soil, irrigation, quantity, quality):
     score = min(1.0, max(0.0, score))
 
     # Grade logic (more granular)
-    if score >= 0.85:
-        grade = 'A+'
-        cert = 'Organic Premium Plus'
-    elif score >= 0.7:
-        grade = 'A'
-        cert = 'Organic Premium'
-    elif score >= 0.55:
-        grade = 'B'
-        cert = 'Certified Good'
-    elif score >= 0.4:
-        grade = 'C'
-        cert = 'Standard'
+    for threshold, grade, cert in GRADE_BANDS:
+        if score >= threshold:
+            break
     else:
-        grade = 'D'
-        cert = 'Needs Improvement'
-    return round(score, 2), grade, cert
\ No newline at end of file
+        grade, cert = LOWEST_GRADE
+    return round(score, 2), grade, cert
+
+
+class _Encoding:
+    # Integer codes for one categorical feature plus a weight lookup array.
+    # Unknown values map to the last slot, which holds the fallback weight.
+    def __init__(self, weights, default):
+        self.codes = {name: i for i, name in enumerate(weights)}
+        self.unknown = len(weights)
+        self.weights = np.array(list(weights.values()) + [default], dtype=np.float64)
+
+    def encode(self, values):
+        codes = self.codes
+        unknown = self.unknown
+        return np.fromiter((codes.get(v, unknown) for v in values), dtype=np.intp, count=len(values))
+
+
+_FERTILIZER = _Encoding(FERTILIZER_WEIGHTS, FERTILIZER_DEFAULT)
+_SOIL = _Encoding(SOIL_WEIGHTS, SOIL_DEFAULT)
+_IRRIGATION = _Encoding(IRRIGATION_WEIGHTS, IRRIGATION_DEFAULT)
+_QUALITY = _Encoding(QUALITY_WEIGHTS, QUALITY_DEFAULT)
+_INTERACTION_CODES = np.array([_FERTILIZER.codes[f] for f in INTERACTION_FERTILIZERS], dtype=np.intp)
+_GRADE_THRESHOLDS = np.array([band[0] for band in GRADE_BANDS], dtype=np.float64)
+_GRADE_LABELS = [(band[1], band[2]) for band in GRADE_BANDS] + [LOWEST_GRADE]
+
+
+def grade_crops(rows):
+    """Grade many products in one vectorized pass.
+
+    `rows` is a sequence of (fertilizer, organic, soil, irrigation, quantity, quality)
+    tuples. Returns a list of (score, grade, certification) tuples identical to calling
+    `grade_crop` on each row. Rows with a missing feature get (0, 'N/A', 'N/A').
+    """
+    n = len(rows)
+    results = [(0, 'N/A', 'N/A')] * n
+    valid = [i for i, row in enumerate(rows) if all(v is not None for v in row)]
+    if not valid:
+        return results
+
+    fertilizer = [rows[i][0].lower() for i in valid]
+    organic = np.fromiter((rows[i][1].lower() == 'organic' for i in valid), dtype=bool, count=len(valid))
+    soil = [rows[i][2].lower() for i in valid]
+    irrigation = [rows[i][3].lower() for i in valid]
+    quantity = np.fromiter((float(rows[i][4]) for i in valid), dtype=np.float64, count=len(valid))
+    quality = [rows[i][5].lower() for i in valid]
+
+    fertilizer_codes = _FERTILIZER.encode(fertilizer)
+    interaction = organic & np.isin(fertilizer_codes, _INTERACTION_CODES)
+
+    # Accumulate in the same order as grade_crop so float results match exactly
+    score = np.zeros(len(valid), dtype=np.float64)
+    score += _FERTILIZER.weights[fertilizer_codes]
+    score += np.where(organic, ORGANIC_WEIGHT, NON_ORGANIC_WEIGHT)
+    score += _SOIL.weights[_SOIL.encode(soil)]
+    score += _IRRIGATION.weights[_IRRIGATION.encode(irrigation)]
+    score += _QUALITY.weights[_QUALITY.encode(quality)]
+    score += np.minimum(0.12, np.maximum(0.0, quantity / 500))
+    score += np.where(interaction, INTERACTION_BONUS, 0.0)
+    score = np.minimum(1.0, np.maximum(0.0, score))
+
+    # Index of the first band whose threshold the score reaches (len(bands) means lowest grade)
+    bands = np.argmax(score[:, None] >= _GRADE_THRESHOLDS[None, :], axis=1)
+    bands[score < _GRADE_THRESHOLDS[-1]] = len(GRADE_BANDS)
+
+    # Python's round() on the float keeps rounding identical to grade_crop
+    for i, s, b in zip(valid, score.tolist(), bands.tolist()):
+        grade, cert = _GRADE_LABELS[b]
+        results[i] = (round(s, 2), grade, cert)
+    return results
@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
+
+from passwords import hash_password, password_hasher
 
 db = SQLAlchemy()
 
@@ -9,9 +11,11 @@ class User(db.Model):
     password_hash = db.Column(db.String(200), nullable=False)
     role = db.Column(db.String(20), nullable=False)  # 'farmer', 'consumer', 'admin'
     wallet_address = db.Column(db.String(100), nullable=True)  # linked wallet
+    active = db.Column(db.Boolean, nullable=True, default=True)  # deactivated users cannot log in; NULL (older rows) is active
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        # Hashed inline with the configured method; request handlers go through password_hasher's pool instead
+        self.password_hash = hash_password(password, password_hasher.method)
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
@@ -26,9 +30,9 @@ class Product(db.Model):
     organic = db.Column(db.String(20))
     soil = db.Column(db.String(80))
     irrigation = db.Column(db.String(80))
-    farmer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    tx_hash = db.Column(db.String(200), nullable=True)  # blockchain tx hash
-    assigned_transporter_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    farmer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    tx_hash = db.Column(db.String(200), nullable=True, index=True)  # blockchain tx hash; NULL until anchored by chain_submitter.py
+    assigned_transporter_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
 
     assigned_transporter = db.relationship("User", foreign_keys=[assigned_transporter_id])
     farmer = db.relationship("User", backref="products", foreign_keys=[farmer_id])
@@ -36,12 +40,13 @@ class Product(db.Model):
 
 class QualityInspection(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     inspector_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     grade = db.Column(db.String(20))
     certificate = db.Column(db.String(120))
     ml_score = db.Column(db.Float)
     comments = db.Column(db.Text)
+    tx_hash = db.Column(db.String(200), nullable=True, index=True)  # batch anchoring the inspection, set by chain_submitter.py
     timestamp = db.Column(db.DateTime, server_default=db.func.now())
 
     product = db.relationship('Product', backref='inspections')
@@ -50,14 +55,149 @@ class QualityInspection(db.Model):
 # Retailer sale model
 class RetailSale(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     retailer_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     sale_price = db.Column(db.Float, nullable=False)
     retail_details = db.Column(db.Text)
     qr_data = db.Column(db.Text)
-    qr_img = db.Column(db.Text)  # base64 PNG
-    tx_hash = db.Column(db.String(200), nullable=True)  # blockchain tx hash
+    qr_img = db.Column(db.Text)  # legacy inline base64 PNG, moved to the QR store by migrations.py
+    qr_hash = db.Column(db.String(64), nullable=True, index=True)  # sha256 of qr_data, PNG served from /qr/<hash>.png
+    tx_hash = db.Column(db.String(200), nullable=True, index=True)  # blockchain tx hash; NULL until anchored by chain_submitter.py
     timestamp = db.Column(db.DateTime, server_default=db.func.now())
 
     product = db.relationship('Product', backref='retail_sales')
     retailer = db.relationship('User', backref='retail_sales')
+
+
+# Persisted ML grades keyed on the product feature tuple (see grade_cache.py)
+class MLGradeCache(db.Model):
+    key = db.Column(db.String(600), primary_key=True)  # JSON-encoded feature tuple
+    model_version = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+    grade = db.Column(db.String(20), nullable=False)
+    certification = db.Column(db.String(120), nullable=False)
+
+# Background job queued by jobs.py (QR rendering, chain submission, ...)
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # 'queued', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    next_attempt_at = db.Column(db.Float, nullable=True)  # epoch seconds, set while waiting to retry
+    owner = db.Column(db.String(100), nullable=True)  # process holding the lease: host:pid:nonce
+    lease_until = db.Column(db.Float, nullable=True)  # epoch seconds; renewed by the owner's heartbeat, adoptable after
+    result = db.Column(db.Text, nullable=True)  # JSON
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+# ---------- On-chain mirror tables, filled by chain_indexer.py ----------
+class ChainCrop(db.Model):
+    id = db.Column(db.Integer, primary_key=True)  # CropRegistry crop id
+    farmer_address = db.Column(db.String(42), nullable=False, index=True)
+    name = db.Column(db.String(120))
+    details = db.Column(db.Text)
+    price = db.Column(db.String(80))  # uint256 wei as a decimal string
+    quantity = db.Column(db.String(80))  # uint256 as a decimal string
+    quality = db.Column(db.String(80))
+    fertilizer = db.Column(db.String(120))
+    organic = db.Column(db.String(20))
+    soil = db.Column(db.String(80))
+    irrigation = db.Column(db.String(80))
+    block_number = db.Column(db.Integer, nullable=False)
+    tx_hash = db.Column(db.String(66), nullable=False, index=True)
+    log_index = db.Column(db.Integer, nullable=False)
+
+
+class ChainTransport(db.Model):
+    id = db.Column(db.Integer, primary_key=True)  # TransporterRegistry record id
+    crop_id = db.Column(db.Integer, nullable=False, index=True)
+    transporter_address = db.Column(db.String(42), nullable=False)
+    location = db.Column(db.Text)
+    custody = db.Column(db.Text)
+    timestamp = db.Column(db.Integer)  # block timestamp, epoch seconds
+    block_number = db.Column(db.Integer, nullable=False)
+    tx_hash = db.Column(db.String(66), nullable=False)
+    log_index = db.Column(db.Integer, nullable=False)
+
+
+class ChainInspection(db.Model):
+    id = db.Column(db.Integer, primary_key=True)  # QualityInspectionRegistry inspection id
+    product_id = db.Column(db.Integer, nullable=False, index=True)
+    inspector_address = db.Column(db.String(42), nullable=False)
+    score = db.Column(db.Integer)  # scaled by 100
+    grade = db.Column(db.String(20))
+    certificate = db.Column(db.String(120))
+    comments = db.Column(db.Text)
+    timestamp = db.Column(db.Integer)  # block timestamp, epoch seconds
+    block_number = db.Column(db.Integer, nullable=False)
+    tx_hash = db.Column(db.String(66), nullable=False)
+    log_index = db.Column(db.Integer, nullable=False)
+
+
+# Last block fully indexed per contract
+class IndexerCheckpoint(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    address = db.Column(db.String(42), nullable=False)
+    last_block = db.Column(db.Integer, nullable=False)
+
+
+# Progress of a backfill.py job: every id up to last_id has been processed
+class BackfillCheckpoint(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False)
+    changed = db.Column(db.Integer, nullable=False, default=0)  # rows changed so far
+    updated_at = db.Column(db.DateTime, server_default=db.func.now(), onupdate=db.func.now())
+
+
+# ---------- Server-side chain submissions, written by chain_submitter.py ----------
+class ChainBatch(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    nonce = db.Column(db.Integer, nullable=False)
+    tx_hash = db.Column(db.String(66), nullable=False, index=True)
+    raw_tx = db.Column(db.Text, nullable=False)  # signed transaction, rebroadcast after a restart
+    digest = db.Column(db.String(66), nullable=False)  # keccak of the concatenated record leaves
+    items = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, index=True)  # 'signed', 'sent', 'confirmed', 'failed'
+    error = db.Column(db.Text, nullable=True)
+    block_number = db.Column(db.Integer, nullable=True)
+    gas_used = db.Column(db.Integer, nullable=True)
+    checked_at = db.Column(db.Float, nullable=True)  # epoch seconds of the last broadcast or stale check
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+    confirmed_at = db.Column(db.DateTime, nullable=True)
+
+
+# A record claimed by an unconfirmed or confirmed batch; failed batches release theirs
+class ChainBatchItem(db.Model):
+    entity = db.Column(db.String(20), primary_key=True)  # 'product', 'inspection', 'sale'
+    record_id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('chain_batch.id'), nullable=False, index=True)
+
+
+# ---------- Analytics rollups, kept current by analytics.py ----------
+class FarmerRollup(db.Model):
+    farmer_id = db.Column(db.Integer, primary_key=True)
+    products = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)  # sum of product quantities
+    inspections = db.Column(db.Integer, nullable=False, default=0)  # inspections of the farmer's products
+    scored = db.Column(db.Integer, nullable=False, default=0)  # of which carry an ML score
+    score_sum = db.Column(db.Float, nullable=False, default=0)
+
+
+class RetailerDailySales(db.Model):
+    retailer_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.String(10), primary_key=True)  # YYYY-MM-DD of the sale timestamp
+    sales = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class GradeRollup(db.Model):
+    # '' stands for a missing soil, irrigation or grade
+    soil = db.Column(db.String(80), primary_key=True)
+    irrigation = db.Column(db.String(80), primary_key=True)
+    grade = db.Column(db.String(20), primary_key=True)
+    inspections = db.Column(db.Integer, nullable=False, default=0)
+    scored = db.Column(db.Integer, nullable=False, default=0)
+    score_sum = db.Column(db.Float, nullable=False, default=0)
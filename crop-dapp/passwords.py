@@ -0,0 +1,92 @@
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from worker_pool import BoundedProcessPool
+
+# werkzeug's scrypt defaults (N=2**15, r=8, p=1)
+SCRYPT_DEFAULT = 'scrypt:32768:8:1'
+# pbkdf2 digests from weakest to strongest
+PBKDF2_DIGESTS = ('sha1', 'sha224', 'sha256', 'sha384', 'sha512')
+
+
+def normalize_method(method):
+    """Spell out werkzeug's defaults so a method string compares equal to a stored hash prefix.
+
+    'scrypt' -> 'scrypt:32768:8:1', 'pbkdf2' -> 'pbkdf2:sha256:<default iterations>'.
+    """
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        return SCRYPT_DEFAULT if len(parts) == 1 else method
+    if parts[0] == 'pbkdf2':
+        hash_name = parts[1] if len(parts) > 1 else 'sha256'
+        iterations = parts[2] if len(parts) > 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f'pbkdf2:{hash_name}:{iterations}'
+    raise ValueError(f"unsupported password hash method {method!r}")
+
+
+def _strength(method):
+    # (family, cost parameters) of a normalized method; scrypt is memory-hard, so it ranks above pbkdf2
+    parts = method.split(':')
+    if parts[0] == 'scrypt':
+        return 1, tuple(int(p) for p in parts[1:4])
+    digest = PBKDF2_DIGESTS.index(parts[1]) if parts[1] in PBKDF2_DIGESTS else -1
+    return 0, (digest, int(parts[2]))
+
+
+def needs_rehash(stored_method, policy):
+    """Whether a hash made with stored_method is weaker than the normalized policy method.
+
+    Weaker means an older family (pbkdf2 under an scrypt policy), or the same
+    family with every cost parameter at most the policy's and one below it.
+    A hash that is stronger in any parameter is kept, so lowering the
+    configured cost never downgrades existing hashes.
+    """
+    try:
+        family, params = _strength(normalize_method(stored_method))
+    except ValueError:
+        return True
+    policy_family, policy_params = _strength(policy)
+    if family != policy_family:
+        return family < policy_family
+    return params != policy_params and all(a <= b for a, b in zip(params, policy_params))
+
+
+def hash_password(password, method):
+    return generate_password_hash(password, method)
+
+
+def verify_password(pwhash, password, method):
+    """Check a password; returns (ok, new_hash) where new_hash is set when the stored hash should be upgraded."""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if needs_rehash(pwhash.split('$', 1)[0], method):
+        return True, generate_password_hash(password, method)
+    return True, None
+
+
+class PasswordHasher:
+    """Password hashing and checks, run on a bounded process pool.
+
+    The key derivation is deliberately slow, so it runs off the request threads;
+    when the pool's backlog is full, hash() and verify() raise PoolSaturated at
+    once and the caller answers 429. Stored hashes weaker than the configured
+    method are replaced with it on the next successful login (see needs_rehash).
+    """
+
+    def __init__(self):
+        self.method = SCRYPT_DEFAULT
+        self.pool = BoundedProcessPool('password-hash')
+
+    def init_app(self, app):
+        self.method = normalize_method(app.config.get('PASSWORD_HASH_METHOD', 'scrypt'))
+        self.pool.configure(app.config.get('PASSWORD_HASH_WORKERS', 0),
+                            app.config.get('PASSWORD_HASH_MAX_PENDING', 64),
+                            app.config.get('PASSWORD_HASH_TIMEOUT', 10.0))
+
+    def hash(self, password):
+        return self.pool.call(hash_password, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self.pool.call(verify_password, pwhash, password, self.method)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, func, literal, union_all
+from sqlalchemy.orm import Session, aliased
+
+from models import db, User, Product, QualityInspection, RetailSale, ChainTransport
+
+# Timeline order of the stages a product goes through
+STAGES = ('farm', 'transport', 'inspection', 'retail')
+
+
+def _json_object(dialect, **fields):
+    fn = func.json_build_object if dialect == 'postgresql' else func.json_object
+    args = []
+    for key, value in fields.items():
+        args.extend((literal(key), value))
+    return fn(*args)
+
+
+def build_trace(product_id):
+    """Farm -> transport -> inspection -> retail timeline for one product.
+
+    Every stage is one branch of a single UNION ALL statement; each branch packs
+    its columns into a JSON object so the branches share one (stage, id, data)
+    shape. Returns None if the product does not exist.
+    """
+    dialect = db.engine.dialect.name
+    farmer = aliased(User)
+    transporter = aliased(User)
+    inspector = aliased(User)
+    retailer = aliased(User)
+
+    farm = db.select(
+        literal('farm').label('stage'), Product.id.label('ref_id'),
+        _json_object(
+            dialect,
+            name=Product.name, description=Product.description, quantity=Product.quantity,
+            quality=Product.quality, fertilizer=Product.fertilizer, organic=Product.organic,
+            soil=Product.soil, irrigation=Product.irrigation, tx_hash=Product.tx_hash,
+            farmer=farmer.username, farmer_wallet=farmer.wallet_address,
+            transporter=transporter.username
+        ).label('data')
+    ).join(farmer, farmer.id == Product.farmer_id).outerjoin(
+        transporter, transporter.id == Product.assigned_transporter_id
+    ).where(Product.id == product_id)
+
+    transport = db.select(
+        literal('transport').label('stage'), ChainTransport.id.label('ref_id'),
+        _json_object(
+            dialect,
+            location=ChainTransport.location, custody=ChainTransport.custody,
+            transporter=ChainTransport.transporter_address, timestamp=ChainTransport.timestamp,
+            tx_hash=ChainTransport.tx_hash
+        ).label('data')
+    ).where(ChainTransport.crop_id == product_id)
+
+    inspection = db.select(
+        literal('inspection').label('stage'), QualityInspection.id.label('ref_id'),
+        _json_object(
+            dialect,
+            grade=QualityInspection.grade, certificate=QualityInspection.certificate,
+            ml_score=QualityInspection.ml_score, comments=QualityInspection.comments,
+            inspector=inspector.username, tx_hash=QualityInspection.tx_hash, timestamp=QualityInspection.timestamp
+        ).label('data')
+    ).join(inspector, inspector.id == QualityInspection.inspector_id).where(QualityInspection.product_id == product_id)
+
+    retail = db.select(
+        literal('retail').label('stage'), RetailSale.id.label('ref_id'),
+        _json_object(
+            dialect,
+            sale_price=RetailSale.sale_price, retail_details=RetailSale.retail_details,
+            retailer=retailer.username, qr_hash=RetailSale.qr_hash, tx_hash=RetailSale.tx_hash,
+            timestamp=RetailSale.timestamp
+        ).label('data')
+    ).join(retailer, retailer.id == RetailSale.retailer_id).where(RetailSale.product_id == product_id)
+
+    rows = db.session.execute(union_all(farm, transport, inspection, retail)).all()
+    if not any(stage == 'farm' for stage, _, _ in rows):
+        return None
+    timeline = []
+    for stage, ref_id, data in sorted(rows, key=lambda r: (STAGES.index(r[0]), r[1])):
+        if isinstance(data, str):
+            data = json.loads(data)
+        timeline.append({'stage': stage, 'id': ref_id, **data})
+    return {'product_id': product_id, 'timeline': timeline}
+
+
+class TraceCache:
+    """Serialized /trace responses with their ETags, bounded LRU with a TTL.
+
+    Entries are dropped after the commit that writes a sale, inspection or product
+    change for that product (see the session hooks below). The TTL bounds staleness
+    for writes made by other processes, such as chain_indexer.py.
+    """
+
+    def __init__(self, maxsize=2048, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('TRACE_CACHE_SIZE', self.maxsize)
+        self.ttl = app.config.get('TRACE_CACHE_TTL', self.ttl)
+
+    def get(self, product_id):
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(product_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(product_id)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, product_id, payload):
+        body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._entries[product_id] = (time.monotonic() + self.ttl, etag, body)
+            self._entries.move_to_end(product_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return etag, body
+
+    def invalidate(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._entries.pop(product_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'maxsize': self.maxsize, 'ttl': self.ttl}
+
+
+trace_cache = TraceCache()
+
+
+# Collect touched product ids during flush, drop them once the transaction commits
+def _mark_dirty(product_id):
+    def listener(mapper, connection, target):
+        pid = product_id(target)
+        if pid is not None:
+            Session.object_session(target).info.setdefault('trace_dirty', set()).add(int(pid))
+    return listener
+
+
+for _model, _product_id in ((RetailSale, lambda t: t.product_id),
+                            (QualityInspection, lambda t: t.product_id),
+                            (Product, lambda t: t.id)):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _mark_dirty(_product_id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    dirty = session.info.pop('trace_dirty', None)
+    if dirty:
+        trace_cache.invalidate(dirty)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('trace_dirty', None)
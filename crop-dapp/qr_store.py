@@ -0,0 +1,62 @@
+import hashlib
+import io
+import os
+import re
+import tempfile
+
+HASH_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def qr_hash(qr_data):
+    return hashlib.sha256(qr_data.encode('utf-8')).hexdigest()
+
+
+def render_qr_png(qr_data):
+    import qrcode  # only needed when an image is actually rendered
+    img = qrcode.make(qr_data)
+    buf = io.BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class QRStore:
+    """Content-addressed store of QR PNGs on local disk.
+
+    Images live at <root>/<hh>/<hash>.png where hash is the sha256 of the encoded
+    qr_data, so the same payload is only ever rendered and written once and a hash
+    always names the same bytes (which is what makes immutable caching safe).
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+
+    def init_app(self, app):
+        self.root = app.config.get('QR_STORE_DIR') or os.path.join(app.instance_path, 'qr')
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest + '.png')
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put_png(self, digest, png):
+        path = self.path(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a concurrent reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(png)
+        os.replace(tmp, path)
+        return digest
+
+    def put(self, qr_data):
+        digest = qr_hash(qr_data)
+        if not self.exists(digest):
+            self.put_png(digest, render_qr_png(qr_data))
+        return digest
+
+
+qr_store = QRStore()
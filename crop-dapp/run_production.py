@@ -1,5 +1,10 @@
 from waitress import serve
-from app import app
+from app import create_app
+from jobs import job_queue
 
 if __name__ == "__main__":
-    serve(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    app = create_app()
+    # Adopt background jobs of processes that died; live siblings keep theirs
+    with app.app_context():
+        job_queue.resume()
+    serve(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,147 @@
+import re
+
+from sqlalchemy import and_, case, column, func, literal_column, or_, select, table, text
+
+from catalogue import latest_inspection_id
+from listing import _contains
+from models import db, Product, QualityInspection
+
+FTS_TABLE = 'product_fts'
+# Product columns mirrored into the index, in bm25() weight order
+FTS_COLUMNS = ('name', 'description', 'fertilizer', 'soil', 'irrigation', 'organic')
+FTS_WEIGHTS = (10.0, 2.0, 1.0, 1.0, 1.0, 1.0)
+
+_fts = table(FTS_TABLE, column('rowid'))
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def _fts_ddl():
+    cols = ', '.join(FTS_COLUMNS)
+    new = ', '.join(f'new.{c}' for c in FTS_COLUMNS)
+    old = ', '.join(f'old.{c}' for c in FTS_COLUMNS)
+    watched = ', '.join(FTS_COLUMNS)
+    return [
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({cols}, content='product', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON product BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON product BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        # Only text column changes touch the index; transporter assignment and tx_hash updates do not
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {watched} ON product BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def fts_enabled():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def install_fts(conn):
+    """Create the product_fts index and its sync triggers (SQLite only).
+
+    Triggers live in the database, so ORM writes, Core bulk inserts and raw SQL
+    all keep the index current. A newly created index is filled from product.
+    """
+    if conn.dialect.name != 'sqlite':
+        return False
+    exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': FTS_TABLE}).first()
+    statements = _fts_ddl()
+    if exists:
+        statements = statements[1:]
+    for statement in statements:
+        conn.execute(text(statement))
+    if not exists:
+        rebuild_fts(conn)
+    return True
+
+
+def rebuild_fts(conn):
+    """Re-read every product into the index, e.g. after writes made with the triggers absent."""
+    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def match_expression(q):
+    """User text as an FTS5 query: every word must match, the last one as a prefix.
+
+    Words are quoted, so operators and punctuation in the input cannot produce a
+    syntax error. Returns None when the input holds no words.
+    """
+    tokens = _TOKEN_RE.findall(q or '')
+    if not tokens:
+        return None
+    quoted = [f'"{t}"' for t in tokens]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _organic():
+    return case((func.lower(Product.organic) == 'organic', 'organic'), else_='inorganic')
+
+
+def _base(match, filters, skip=None):
+    """Products matching the text query and every filter except `skip`, with their latest inspection joined."""
+    query = select(Product.id).select_from(Product).outerjoin(
+        QualityInspection, QualityInspection.id == latest_inspection_id()
+    )
+    if match is not None:
+        if fts_enabled():
+            query = query.join(_fts, _fts.c.rowid == Product.id).where(text(f'{FTS_TABLE} MATCH :match').bindparams(match=match))
+        else:
+            words = _TOKEN_RE.findall(match)
+            query = query.where(and_(*(or_(*(_contains(getattr(Product, c), w) for c in FTS_COLUMNS)) for w in words)))
+    if filters.get('organic') is not None and skip != 'organic':
+        query = query.where(_organic() == ('organic' if filters['organic'] else 'inorganic'))
+    if filters.get('soil') and skip != 'soil':
+        query = query.where(Product.soil == filters['soil'])
+    if filters.get('grade') and skip != 'grade':
+        query = query.where(QualityInspection.grade == filters['grade'])
+    return query
+
+
+def _facet(match, filters, name, expr):
+    # Each facet ignores its own filter, so the counts show what picking another value would return
+    query = _base(match, filters, skip=name).add_columns(expr.label('value')).subquery()
+    rows = db.session.execute(
+        select(query.c.value, func.count()).group_by(query.c.value).order_by(func.count().desc())
+    ).all()
+    return [{'value': value, 'count': count} for value, count in rows]
+
+
+def search_products(q=None, organic=None, soil=None, grade=None, offset=0, limit=24, facets=True):
+    """Ranked product search with facet counts.
+
+    On SQLite the text query runs against the product_fts index and results are
+    ordered by bm25() (name weighted highest); elsewhere it falls back to
+    substring matches ordered by id. Facet counts for organic, soil and grade
+    (of the latest inspection) are GROUP BY queries over the same match.
+    Returns {'total', 'items', 'facets'}.
+    """
+    match = match_expression(q)
+    filters = {'organic': organic, 'soil': soil, 'grade': grade}
+    matched = _base(match, filters)
+
+    query = matched.add_columns(
+        Product.name, Product.description, Product.quantity, Product.quality, Product.fertilizer,
+        Product.organic, Product.soil, Product.irrigation, Product.farmer_id,
+        QualityInspection.grade.label('grade'), QualityInspection.ml_score.label('ml_score')
+    )
+    if match is not None and fts_enabled():
+        weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+        rank = literal_column(f'bm25({FTS_TABLE}, {weights})')
+        query = query.add_columns(rank.label('rank')).order_by(rank, Product.id)
+    else:
+        query = query.order_by(Product.id)
+    rows = db.session.execute(query.offset(offset).limit(limit)).all()
+
+    result = {
+        'total': db.session.execute(select(func.count()).select_from(matched.subquery())).scalar(),
+        'items': [r._asdict() for r in rows],
+    }
+    if facets:
+        result['facets'] = {
+            'organic': _facet(match, filters, 'organic', _organic()),
+            'soil': _facet(match, filters, 'soil', Product.soil),
+            'grade': _facet(match, filters, 'grade', QualityInspection.grade),
+        }
+    return result
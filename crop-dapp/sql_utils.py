@@ -0,0 +1,57 @@
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def upsert(conn, table, rows, index_elements, update_columns=None):
+    """INSERT ... ON CONFLICT DO UPDATE for SQLite and Postgres.
+
+    `update_columns` defaults to every non-key column in the rows. Any other
+    dialect falls back to delete-then-insert on the key.
+    """
+    if not rows:
+        return
+    if update_columns is None:
+        update_columns = [c for c in rows[0] if c not in index_elements]
+    dialect = conn.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table)
+        if update_columns:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=index_elements,
+                set_={c: stmt.excluded[c] for c in update_columns}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+        conn.execute(stmt, rows)
+        return
+    for row in rows:
+        conn.execute(table.delete().where(*(table.c[k] == row[k] for k in index_elements)))
+    conn.execute(table.insert(), rows)
+
+
+def increment(conn, table, rows, index_elements):
+    """Add each row's non-key values onto the stored row, inserting it when missing.
+
+    Used for counters and sums; rows must all carry the same columns.
+    """
+    if not rows:
+        return
+    columns = [c for c in rows[0] if c not in index_elements]
+    dialect = conn.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={c: table.c[c] + stmt.excluded[c] for c in columns}
+        )
+        conn.execute(stmt, rows)
+        return
+    for row in rows:
+        updated = conn.execute(
+            table.update().where(*(table.c[k] == row[k] for k in index_elements)).values(
+                {c: table.c[c] + row[c] for c in columns}
+            )
+        ).rowcount
+        if not updated:
+            conn.execute(table.insert(), [row])
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from worker_pool import BoundedProcessPool
+
+
+def recover_signer(message, signature):
+    """Address that signed an EIP-191 personal message; raises on a malformed signature."""
+    # eth_account is slow to import; only pay for it when a signature is checked
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+    return Account.recover_message(encode_defunct(text=message), signature=signature)
+
+
+def recover_chunk(pairs):
+    """Recover a list of (message, signature) pairs in a worker; returns (address, error) per pair."""
+    results = []
+    for message, signature in pairs:
+        try:
+            results.append((recover_signer(message, signature), None))
+        except Exception as e:
+            results.append((None, str(e)))
+    return results
+
+
+class SignatureCache:
+    """LRU of signature recoveries keyed on (message hash, signature).
+
+    A recovery is a pure function of the pair, so entries never go stale; failed
+    recoveries are cached too, so a client retrying a bad signature costs one
+    dictionary lookup. Batches run their misses on a process pool in chunks,
+    which keeps the per-task pickling overhead small next to the EC math.
+    """
+
+    def __init__(self, maxsize=10000, chunk_size=64):
+        self.maxsize = maxsize
+        self.chunk_size = chunk_size
+        self.pool = BoundedProcessPool('wallet-recovery')
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('WALLET_CACHE_SIZE', self.maxsize)
+        self.chunk_size = app.config.get('WALLET_RECOVERY_CHUNK', self.chunk_size)
+        self.pool.configure(app.config.get('WALLET_RECOVERY_WORKERS', 0),
+                            app.config.get('WALLET_RECOVERY_MAX_PENDING', 64),
+                            app.config.get('WALLET_RECOVERY_TIMEOUT', 30.0))
+
+    @staticmethod
+    def key(message, signature):
+        return hashlib.sha256(message.encode('utf-8')).digest(), signature.lower()
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def recover(self, message, signature):
+        """(address, error) for one pair; runs inline, a single recovery is cheaper than a pool round trip."""
+        key = self.key(message, signature)
+        entry = self._lookup(key)
+        if entry is None:
+            entry = recover_chunk([(message, signature)])[0]
+            self._remember(key, entry)
+        return entry
+
+    def recover_many(self, pairs):
+        """(address, error) per pair, in order; misses are spread over the process pool."""
+        keys = [self.key(m, s) for m, s in pairs]
+        results = [self._lookup(k) for k in keys]
+        missing = {}
+        for i, entry in enumerate(results):
+            if entry is None:
+                missing.setdefault(keys[i], i)
+        if missing:
+            todo = list(missing.items())
+            chunks = [[pairs[i] for _, i in todo[n:n + self.chunk_size]] for n in range(0, len(todo), self.chunk_size)]
+            recovered = [entry for chunk in self.pool.map(recover_chunk, chunks) for entry in chunk]
+            found = {}
+            for (key, _), entry in zip(todo, recovered):
+                self._remember(key, entry)
+                found[key] = entry
+            results = [entry if entry is not None else found[keys[i]] for i, entry in enumerate(results)]
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'pool': self.pool.stats()}
+
+
+signature_cache = SignatureCache()
@@ -0,0 +1,100 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class BoundedProcessPool:
+    """Process pool for CPU-bound work that must not tie up request threads.
+
+    At most max_pending calls may be queued or running; beyond that call()
+    raises PoolSaturated immediately so the route can answer 429 instead of
+    parking a waitress thread behind the backlog. Worker processes are started
+    on first use, from a forkserver so they never inherit the server's threads
+    or open database connections. With workers=0 calls run inline, which is
+    what CLI scripts and single-threaded debugging want.
+    """
+
+    def __init__(self, name, workers=0, max_pending=64, timeout=10.0):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def configure(self, workers, max_pending, timeout):
+        self.shutdown()
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+    def _get_executor(self):
+        if self._executor is None:
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+        return self._executor
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+
+    def submit(self, fn, *args):
+        """Queue fn(*args) on a worker (fn must be a module-level function)."""
+        with self._lock:
+            if self._in_flight >= self.max_pending:
+                self.rejected += 1
+                raise PoolSaturated(f"{self.name}: {self.max_pending} calls already pending")
+            self._in_flight += 1
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except Exception:
+                self._in_flight -= 1
+                raise
+        future.add_done_callback(self._done)
+        return future
+
+    def call(self, fn, *args):
+        """Run fn(*args) on a worker and wait for the result."""
+        if not self.workers:
+            return fn(*args)
+        future = self.submit(fn, *args)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise PoolSaturated(f"{self.name}: no result within {self.timeout}s")
+
+    def map(self, fn, items):
+        """Run fn over items on the workers, all queued at once; results keep the input order."""
+        if not self.workers:
+            return [fn(item) for item in items]
+        futures = []
+        try:
+            for item in items:
+                futures.append(self.submit(fn, item))
+            return [f.result(timeout=self.timeout) for f in futures]
+        except (PoolSaturated, FutureTimeout) as exc:
+            for f in futures:
+                f.cancel()
+            if isinstance(exc, PoolSaturated):
+                raise
+            raise PoolSaturated(f"{self.name}: no result within {self.timeout}s")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {'workers': self.workers, 'in_flight': self._in_flight, 'max_pending': self.max_pending,
+                    'completed': self.completed, 'rejected': self.rejected}